@@ -1,9 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from datetime import datetime
+from math import lgamma
 from typing import List, Optional, Tuple, Type
 from zoneinfo import ZoneInfo
 
-from numpy.random import default_rng
+import numpy as np
+from django.conf import settings
+from numpy.random import PCG64DXSM, Generator
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.queries.experiments import (
@@ -20,7 +24,7 @@ from posthog.queries.funnels import ClickhouseFunnel
 Probability = float
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Variant:
     key: str
     success_count: int
@@ -29,6 +33,27 @@ class Variant:
 
 EXPECTED_LOSS_SIGNIFICANCE_LEVEL = 0.01
 
+# Number of Monte Carlo draws per variant posterior. Monte Carlo error shrinks with sqrt(N),
+# so at 100k the win probabilities are accurate to roughly ±0.003.
+SIMULATIONS_COUNT = 100_000
+
+# Shared by all simulations, so we don't seed a fresh generator from OS entropy on every call.
+# Generator draws are guarded by the bit generator's lock, so this is safe to use across threads.
+# PCG64DXSM is as fast as the default PCG64 for our beta draws (Philox was ~25% slower),
+# and is the bit generator numpy recommends for new code.
+_random_sampler = Generator(PCG64DXSM())
+
+# Below this many variants, the thread pool overhead outweighs sampling the rows in parallel
+PARALLEL_SAMPLING_MIN_VARIANTS = 5
+
+_sampling_executor: Optional[ThreadPoolExecutor] = None
+
+# The closed form A/B probability sums one term per conversion of the variant with fewer conversions,
+# so its cost grows with the experiment. Past this many conversions, sampling is cheaper and accurate enough.
+CLOSED_FORM_MAX_SUCCESS_COUNT = 1_000_000
+# Number of closed form terms built at once, which bounds the memory used by each calculation
+CLOSED_FORM_BLOCK_SIZE = 2**16
+
 
 class ClickhouseFunnelExperimentResult:
     """
@@ -59,14 +84,16 @@ class ClickhouseFunnelExperimentResult:
     ):
         breakdown_key = f"$feature/{feature_flag.key}"
         self.variants = [variant["key"] for variant in feature_flag.variants]
+        self._variants_set = frozenset(self.variants)
 
         # our filters assume that the given time ranges are in the project timezone.
         # while start and end date are in UTC.
         # so we need to convert them to the project timezone
         if team.timezone:
-            start_date_in_project_timezone = experiment_start_date.astimezone(ZoneInfo(team.timezone))
+            project_timezone = ZoneInfo(team.timezone)
+            start_date_in_project_timezone = experiment_start_date.astimezone(project_timezone)
             end_date_in_project_timezone = (
-                experiment_end_date.astimezone(ZoneInfo(team.timezone)) if experiment_end_date else None
+                experiment_end_date.astimezone(project_timezone) if experiment_end_date else None
             )
 
         query_filter = filter.shallow_clone(
@@ -88,17 +115,23 @@ class ClickhouseFunnelExperimentResult:
 
         validate_event_variants(funnel_results, self.variants)
 
-        filtered_results = [result for result in funnel_results if result[0]["breakdown_value"][0] in self.variants]
+        filtered_results, control_variant, test_variants = self.get_variants(funnel_results)
 
-        control_variant, test_variants = self.get_variants(filtered_results)
+        # With more than one test variant the win probabilities are simulated, so sample the posteriors
+        # up front and reuse the same draws for the expected loss
+        samples = None
+        if control_variant and 1 < len(test_variants) < 10:
+            samples = sample_conversion_rates(_random_sampler, [control_variant, *test_variants], SIMULATIONS_COUNT)
 
-        probabilities = self.calculate_results(control_variant, test_variants)
+        probabilities = self.calculate_results(control_variant, test_variants, samples=samples)
 
         mapping = {
             variant.key: probability for variant, probability in zip([control_variant, *test_variants], probabilities)
         }
 
-        significance_code, loss = self.are_results_significant(control_variant, test_variants, probabilities)
+        significance_code, loss = self.are_results_significant(
+            control_variant, test_variants, probabilities, samples=samples
+        )
 
         return {
             "insight": filtered_results,
@@ -111,13 +144,23 @@ class ClickhouseFunnelExperimentResult:
         }
 
     def get_variants(self, funnel_results):
+        """
+        Filters out results for breakdown values that aren't flag variants, and builds the variants from the rest
+        in the same pass.
+        """
+        filtered_results = []
         control_variant = None
         test_variants = []
         for result in funnel_results:
-            total = result[0]["count"]
+            first_step = result[0]
+            breakdown_value = first_step["breakdown_value"][0]
+            if breakdown_value not in self._variants_set:
+                continue
+
+            filtered_results.append(result)
+            total = first_step["count"]
             success = result[-1]["count"]
             failure = total - success
-            breakdown_value = result[0]["breakdown_value"][0]
             if breakdown_value == CONTROL_VARIANT_KEY:
                 control_variant = Variant(
                     key=breakdown_value,
@@ -127,13 +170,14 @@ class ClickhouseFunnelExperimentResult:
             else:
                 test_variants.append(Variant(breakdown_value, int(success), int(failure)))
 
-        return control_variant, test_variants
+        return filtered_results, control_variant, test_variants
 
     @staticmethod
     def calculate_results(
         control_variant: Variant,
         test_variants: List[Variant],
         priors: Tuple[int, int] = (1, 1),
+        samples: Optional[np.ndarray] = None,
     ) -> List[Probability]:
         """
         Calculates probability that A is better than B. First variant is control, rest are test variants.
@@ -148,6 +192,8 @@ class ClickhouseFunnelExperimentResult:
         you'd need extra evidence of successes to confirm that the variant is indeed better.
 
         By default, we choose a non-informative prior. That is, both success & failure are equally likely.
+
+        `samples` are optional pre-drawn posterior samples, one row per variant with control first.
         """
 
         if not control_variant:
@@ -165,13 +211,14 @@ class ClickhouseFunnelExperimentResult:
                 code="no_data",
             )
 
-        return calculate_probability_of_winning_for_each([control_variant, *test_variants])
+        return calculate_probability_of_winning_for_each([control_variant, *test_variants], samples=samples)
 
     @staticmethod
     def are_results_significant(
         control_variant: Variant,
         test_variants: List[Variant],
         probabilities: List[Probability],
+        samples: Optional[np.ndarray] = None,
     ) -> Tuple[ExperimentSignificanceCode, Probability]:
         control_sample_size = control_variant.success_count + control_variant.failure_count
 
@@ -191,12 +238,17 @@ class ClickhouseFunnelExperimentResult:
             # Sum of probability of winning for all variants except control is less than 90%
             return ExperimentSignificanceCode.LOW_WIN_PROBABILITY, 1
 
-        best_test_variant = max(
-            test_variants,
-            key=lambda variant: variant.success_count / (variant.success_count + variant.failure_count),
+        # Every variant passed the exposure threshold above, so none of these totals are zero
+        conversion_rates = np.array(
+            [variant.success_count / (variant.success_count + variant.failure_count) for variant in test_variants]
         )
+        best_test_variant_index = int(conversion_rates.argmax())
 
-        expected_loss = calculate_expected_loss(best_test_variant, [control_variant])
+        if samples is not None:
+            # Rows follow [control_variant, *test_variants]
+            expected_loss = expected_loss_from_samples(samples[best_test_variant_index + 1], samples[:1])
+        else:
+            expected_loss = calculate_expected_loss(test_variants[best_test_variant_index], [control_variant])
 
         if expected_loss >= EXPECTED_LOSS_SIGNIFICANCE_LEVEL:
             return ExperimentSignificanceCode.HIGH_LOSS, expected_loss
@@ -204,6 +256,58 @@ class ClickhouseFunnelExperimentResult:
         return ExperimentSignificanceCode.SIGNIFICANT, expected_loss
 
 
+def sample_conversion_rates(
+    random_sampler: Generator,
+    variants: List[Variant],
+    simulations_count: int,
+    prior_success: int = 1,
+    prior_failure: int = 1,
+) -> np.ndarray:
+    """
+    Returns a (len(variants), simulations_count) matrix of conversion rate samples, one row per variant.
+
+    Row `i` holds `N=simulations_count` samples from a Beta distribution with alpha = prior_success + variant_success,
+    and beta = prior_failure + variant_failure. All rows are drawn with a single broadcasted call.
+
+    Samples are returned as float32: Monte Carlo error at this many simulations is far above float32 precision,
+    and halving the matrix size speeds up the max/argmax/mean reductions done on it.
+    """
+    alphas = np.array([variant.success_count + prior_success for variant in variants])
+    betas = np.array([variant.failure_count + prior_failure for variant in variants])
+
+    if settings.EXPERIMENT_SAMPLING_THREADS and len(variants) >= PARALLEL_SAMPLING_MIN_VARIANTS:
+        return _sample_conversion_rates_in_parallel(random_sampler, alphas, betas, simulations_count)
+
+    samples = random_sampler.beta(alphas[:, None], betas[:, None], size=(len(variants), simulations_count))
+    return samples.astype(np.float32, copy=False)
+
+
+def _get_sampling_executor() -> ThreadPoolExecutor:
+    global _sampling_executor
+    if _sampling_executor is None:
+        _sampling_executor = ThreadPoolExecutor(
+            max_workers=settings.EXPERIMENT_SAMPLING_THREADS, thread_name_prefix="experiment-sampling"
+        )
+    return _sampling_executor
+
+
+def _sample_conversion_rates_in_parallel(
+    random_sampler: Generator, alphas: np.ndarray, betas: np.ndarray, simulations_count: int
+) -> np.ndarray:
+    # Each row gets its own generator seeded from the shared one, so rows can be drawn concurrently
+    # without contending on the shared generator's lock
+    seeds = random_sampler.integers(2**63, size=len(alphas))
+    samples = np.empty((len(alphas), simulations_count), dtype=np.float32)
+
+    def sample_row(index: int) -> None:
+        row_sampler = Generator(PCG64DXSM(seeds[index]))
+        samples[index] = row_sampler.beta(alphas[index], betas[index], simulations_count)
+
+    # Consume the results so exceptions from the workers are raised here
+    list(_get_sampling_executor().map(sample_row, range(len(alphas))))
+    return samples
+
+
 def calculate_expected_loss(target_variant: Variant, variants: List[Variant]) -> float:
     """
     Calculates expected loss in conversion rate for a given variant.
@@ -216,71 +320,63 @@ def calculate_expected_loss(target_variant: Variant, variants: List[Variant]) ->
     The unit of the return value is conversion rate values
 
     """
-    random_sampler = default_rng()
-    prior_success = 1
-    prior_failure = 1
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Beta distribution with alpha = prior_success + variant_sucess,
-        # and beta = prior_failure + variant_failure
-        samples = random_sampler.beta(
-            variant.success_count + prior_success,
-            variant.failure_count + prior_failure,
-            simulations_count,
-        )
-        variant_samples.append(samples)
-
-    target_variant_samples = random_sampler.beta(
-        target_variant.success_count + prior_success,
-        target_variant.failure_count + prior_failure,
-        simulations_count,
-    )
-
-    loss = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        loss += max(0, max(variant_conversions[i]) - target_variant_samples[i])
-
-    return loss / simulations_count
-
-
-def simulate_winning_variant_for_conversion(target_variant: Variant, variants: List[Variant]) -> Probability:
-    random_sampler = default_rng()
-    prior_success = 1
-    prior_failure = 1
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Beta distribution with alpha = prior_success + variant_sucess,
-        # and beta = prior_failure + variant_failure
-        samples = random_sampler.beta(
-            variant.success_count + prior_success,
-            variant.failure_count + prior_failure,
-            simulations_count,
-        )
-        variant_samples.append(samples)
+    samples = sample_conversion_rates(_random_sampler, [target_variant, *variants], SIMULATIONS_COUNT)
+
+    return expected_loss_from_samples(samples[0], samples[1:])
+
+
+def expected_loss_from_samples(target_variant_samples: np.ndarray, variant_samples: np.ndarray) -> float:
+    """
+    Calculates expected loss from posterior samples already drawn for the target variant (1D)
+    and the variants it's compared against (2D, one row per variant).
+    """
+    # For each simulation, the loss is how much better the best of the other variants did than the target
+    max_variant_samples = variant_samples.max(axis=0)
+    loss = np.maximum(max_variant_samples - target_variant_samples, 0)
+
+    return float(loss.mean())
 
-    target_variant_samples = random_sampler.beta(
-        target_variant.success_count + prior_success,
-        target_variant.failure_count + prior_failure,
-        simulations_count,
-    )
 
-    winnings = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        if target_variant_samples[i] > max(variant_conversions[i]):
-            winnings += 1
+def logbeta(x: float, y: float) -> float:
+    return lgamma(x) + lgamma(y) - lgamma(x + y)
 
-    return winnings / simulations_count
 
+def probability_B_beats_A(A_alpha: int, A_beta: int, B_alpha: int, B_beta: int) -> Probability:
+    """
+    Calculates the probability that a sample from Beta(B_alpha, B_beta) is higher than a sample from Beta(A_alpha, A_beta).
+    Calculations from: https://www.evanmiller.org/bayesian-ab-testing.html#binary_ab
 
-def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[Probability]:
+    The closed form is a sum with one term per unit of B_alpha, and each term is the previous one times a
+    rational factor. Terms are built a block at a time from the cumulative sum of the log factors, carrying
+    the log of the next term between blocks, so memory stays bounded however large the alphas get.
+    """
+    if B_alpha > A_alpha:
+        # P(B > A) = 1 - P(A > B), so sum over whichever alpha is smaller
+        return 1 - probability_B_beats_A(B_alpha, B_beta, A_alpha, A_beta)
+
+    log_term = logbeta(A_alpha, A_beta + B_beta) - logbeta(A_alpha, A_beta)
+    total = 0.0
+    for start in range(0, B_alpha, CLOSED_FORM_BLOCK_SIZE):
+        i = np.arange(start, min(start + CLOSED_FORM_BLOCK_SIZE, B_alpha))
+        log_factors = np.log(A_alpha + i) + np.log(B_beta + i) - np.log(A_alpha + A_beta + B_beta + i) - np.log1p(i)
+        cumulative_log_factors = np.cumsum(log_factors)
+        log_terms = log_term + np.concatenate(([0.0], cumulative_log_factors[:-1]))
+        total += float(np.exp(log_terms).sum())
+        log_term += float(cumulative_log_factors[-1])
+
+    return total
+
+
+def calculate_probability_of_winning_for_each(
+    variants: List[Variant], samples: Optional[np.ndarray] = None
+) -> List[Probability]:
     """
     Calculates the probability of winning for each variant.
+
+    With a single test variant this uses the closed form solution, unless both variants have more conversions
+    than it can sum cheaply. Otherwise, each variant's posterior is sampled
+    once, and a variant wins a simulation when it has the highest conversion rate in it. The win rate of every
+    variant then comes from the same sample matrix, which callers can pass in to reuse their own draws.
     """
     if len(variants) > 10:
         raise ValidationError(
@@ -288,10 +384,21 @@ def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[P
             code="too_much_data",
         )
 
-    probabilities = []
-    # simulate winning for each test variant
-    for index, variant in enumerate(variants):
-        probabilities.append(simulate_winning_variant_for_conversion(variant, variants[:index] + variants[index + 1 :]))
+    if len(variants) == 2 and min(variant.success_count for variant in variants) < CLOSED_FORM_MAX_SUCCESS_COUNT:
+        # Plain A/B test: skip the simulation, there's a closed form solution
+        control_variant, test_variant = variants
+        probability = probability_B_beats_A(
+            control_variant.success_count + 1,
+            control_variant.failure_count + 1,
+            test_variant.success_count + 1,
+            test_variant.failure_count + 1,
+        )
+        return [max(0, 1 - probability), probability]
+
+    if samples is None:
+        samples = sample_conversion_rates(_random_sampler, variants, SIMULATIONS_COUNT)
+    winners = samples.argmax(axis=0)
+    probabilities = (np.bincount(winners, minlength=len(variants)) / samples.shape[1]).tolist()
 
     total_test_probabilities = sum(probabilities[1:])
 
@@ -302,32 +409,28 @@ def validate_event_variants(funnel_results, variants):
     if not funnel_results or not funnel_results[0]:
         raise ValidationError("No experiment events have been ingested yet.", code="no-events")
 
-    eventsWithOrderZero = []
+    test_variants = [variant for variant in variants if variant != CONTROL_VARIANT_KEY]
+    test_variants_set = frozenset(test_variants)
+
+    # Single pass over the first funnel step of each breakdown, stopping as soon as
+    # both "control" and at least one of the test variants are found
+    control_found = False
+    test_variant_found = False
     for eventArr in funnel_results:
         for event in eventArr:
-            if event.get("order") == 0:
-                eventsWithOrderZero.append(event)
+            if event.get("order") != 0:
+                continue
+            event_variant = event.get("breakdown_value")[0]
+            if event_variant == CONTROL_VARIANT_KEY:
+                control_found = True
+            elif event_variant in test_variants_set:
+                test_variant_found = True
+        if control_found and test_variant_found:
+            break
 
     missing_variants = []
-
-    # Check if "control" is present
-    control_found = False
-    for event in eventsWithOrderZero:
-        event_variant = event.get("breakdown_value")[0]
-        if event_variant == "control":
-            control_found = True
-            break
     if not control_found:
-        missing_variants.append("control")
-
-    # Check if at least one of the test variants is present
-    test_variants = [variant for variant in variants if variant != "control"]
-    test_variant_found = False
-    for event in eventsWithOrderZero:
-        event_variant = event.get("breakdown_value")[0]
-        if event_variant in test_variants:
-            test_variant_found = True
-            break
+        missing_variants.append(CONTROL_VARIANT_KEY)
     if not test_variant_found:
         missing_variants.extend(test_variants)
 
@@ -38,9 +38,10 @@ class ClickhouseSecondaryExperimentResult:
         # while start and end date are in UTC.
         # so we need to convert them to the project timezone
         if team.timezone:
-            start_date_in_project_timezone = experiment_start_date.astimezone(ZoneInfo(team.timezone))
+            project_timezone = ZoneInfo(team.timezone)
+            start_date_in_project_timezone = experiment_start_date.astimezone(project_timezone)
             end_date_in_project_timezone = (
-                experiment_end_date.astimezone(ZoneInfo(team.timezone)) if experiment_end_date else None
+                experiment_end_date.astimezone(project_timezone) if experiment_end_date else None
             )
 
         query_filter = filter.shallow_clone(
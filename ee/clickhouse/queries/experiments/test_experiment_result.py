@@ -3,12 +3,18 @@ from functools import lru_cache
 from math import exp, lgamma, log
 from typing import List
 
+from django.test import override_settings
 from flaky import flaky
+from numpy.random import default_rng
 
 from ee.clickhouse.queries.experiments.funnel_experiment_result import (
     ClickhouseFunnelExperimentResult,
     Variant,
     calculate_expected_loss,
+    sample_conversion_rates,
+)
+from ee.clickhouse.queries.experiments.funnel_experiment_result import (
+    probability_B_beats_A as closed_form_probability_B_beats_A,
 )
 from ee.clickhouse.queries.experiments.trend_experiment_result import (
     ClickhouseTrendExperimentResult,
@@ -173,6 +179,35 @@ class TestFunnelExperimentCalculator(unittest.TestCase):
         alternative_probability = calculate_probability_of_winning_for_target(variant_test, [variant_control])
         self.assertAlmostEqual(probability, alternative_probability, places=1)
 
+    def test_closed_form_matches_reference_solution(self):
+        for A_success, A_failure, B_success, B_failure in [
+            (101, 19, 101, 11),
+            (268, 2032, 287, 2015),
+            (5, 3, 2, 9),
+            (1, 1, 1, 1),
+        ]:
+            self.assertAlmostEqual(
+                closed_form_probability_B_beats_A(A_success, A_failure, B_success, B_failure),
+                probability_B_beats_A(A_success, A_failure, B_success, B_failure),
+                places=9,
+            )
+
+    def test_closed_form_matches_reference_solution_over_several_blocks(self):
+        self.assertAlmostEqual(
+            closed_form_probability_B_beats_A(300_001, 700_001, 300_501, 699_501),
+            probability_B_beats_A(300_001, 700_001, 300_501, 699_501),
+            places=6,
+        )
+
+    def test_calculate_results_for_large_ab_test_uses_simulation(self):
+        variant_test = Variant("A", 2_001_000, 7_999_000)
+        variant_control = Variant("B", 2_000_000, 8_000_000)
+
+        _, probability = ClickhouseFunnelExperimentResult.calculate_results(variant_control, [variant_test])
+        self.assertAlmostEqual(
+            probability, closed_form_probability_B_beats_A(2_000_001, 8_000_001, 2_001_001, 7_999_001), places=1
+        )
+
     def test_calculate_results_for_two_test_variants(self):
         variant_test_1 = Variant("A", 100, 10)
         variant_test_2 = Variant("A", 100, 3)
@@ -286,6 +321,28 @@ class TestFunnelExperimentCalculator(unittest.TestCase):
         self.assertAlmostEqual(loss, 0.0004, places=2)
         self.assertEqual(significant, ExperimentSignificanceCode.SIGNIFICANT)
 
+    def test_calculate_results_for_three_test_variants_with_shared_samples(self):
+        variant_test_1 = Variant("A", 100, 10)
+        variant_test_2 = Variant("A", 100, 3)
+        variant_test_3 = Variant("A", 100, 30)
+        variant_control = Variant("B", 100, 18)
+        test_variants = [variant_test_1, variant_test_2, variant_test_3]
+
+        samples = sample_conversion_rates(default_rng(), [variant_control, *test_variants], 100_000)
+
+        probabilities = ClickhouseFunnelExperimentResult.calculate_results(
+            variant_control, test_variants, samples=samples
+        )
+        self.assertAlmostEqual(sum(probabilities), 1)
+        self.assertAlmostEqual(probabilities[0], 0.0, places=1)
+        self.assertAlmostEqual(probabilities[2], 0.967, places=1)
+
+        significant, loss = ClickhouseFunnelExperimentResult.are_results_significant(
+            variant_control, test_variants, probabilities, samples=samples
+        )
+        self.assertAlmostEqual(loss, 0.0004, places=2)
+        self.assertEqual(significant, ExperimentSignificanceCode.SIGNIFICANT)
+
     def test_calculate_results_for_three_test_variants_almost_equal(self):
         variant_control = Variant("B", 130, 65)
         variant_test_1 = Variant("A", 120, 60)
@@ -408,6 +465,22 @@ class TestFunnelExperimentCalculator(unittest.TestCase):
         self.assertAlmostEqual(loss, 1, places=2)
         self.assertEqual(significant, ExperimentSignificanceCode.LOW_WIN_PROBABILITY)
 
+    @override_settings(EXPERIMENT_SAMPLING_THREADS=2)
+    def test_calculate_results_with_parallel_sampling(self):
+        variant_control = Variant("B", 100, 18)
+        test_variants = [Variant("A", 100, failures) for failures in (17, 16, 30, 31, 29)]
+
+        samples = sample_conversion_rates(default_rng(), [variant_control, *test_variants], 100_000)
+        self.assertEqual(samples.shape, (6, 100_000))
+
+        probabilities = ClickhouseFunnelExperimentResult.calculate_results(
+            variant_control, test_variants, samples=samples
+        )
+        self.assertAlmostEqual(sum(probabilities), 1)
+        self.assertAlmostEqual(probabilities[0], 0.241, places=1)
+        self.assertAlmostEqual(probabilities[1], 0.322, places=1)
+        self.assertAlmostEqual(probabilities[2], 0.425, places=1)
+
 
 # calculation: https://www.evanmiller.org/bayesian-ab-testing.html#count_ab
 def calculate_probability_of_winning_for_target_count_data(
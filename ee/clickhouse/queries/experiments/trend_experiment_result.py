@@ -5,6 +5,7 @@ from math import exp, lgamma, log
 from typing import List, Optional, Tuple, Type
 from zoneinfo import ZoneInfo
 
+import numpy as np
 from numpy.random import default_rng
 from rest_framework.exceptions import ValidationError
 
@@ -32,7 +33,7 @@ Probability = float
 P_VALUE_SIGNIFICANCE_LEVEL = 0.05
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Variant:
     key: str
     count: int
@@ -86,9 +87,10 @@ class ClickhouseTrendExperimentResult:
         # while start and end date are in UTC.
         # so we need to convert them to the project timezone
         if team.timezone:
-            start_date_in_project_timezone = experiment_start_date.astimezone(ZoneInfo(team.timezone))
+            project_timezone = ZoneInfo(team.timezone)
+            start_date_in_project_timezone = experiment_start_date.astimezone(project_timezone)
             end_date_in_project_timezone = (
-                experiment_end_date.astimezone(ZoneInfo(team.timezone)) if experiment_end_date else None
+                experiment_end_date.astimezone(project_timezone) if experiment_end_date else None
             )
 
         uses_math_aggregation = uses_math_aggregation_by_user_or_property_value(filter)
@@ -363,13 +365,9 @@ def simulate_winning_variant_for_arrival_rates(target_variant: Variant, variants
         target_variant.count + 1, 1 / target_variant.exposure, simulations_count
     )
 
-    winnings = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        if target_variant_samples[i] > max(variant_conversions[i]):
-            winnings += 1
+    max_variant_samples = np.asarray(variant_samples).max(axis=0)
 
-    return winnings / simulations_count
+    return float(np.mean(target_variant_samples > max_variant_samples))
 
 
 def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[Probability]:
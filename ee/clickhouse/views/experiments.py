@@ -104,9 +104,11 @@ def _experiment_results_cached(
     )
 
     exposure_suffix = "" if not exposure_filter else f"_{exposure_filter.toJSON()}"
+    # Results are broken down by flag variant, so changing the variants must not serve stale results
+    variants_suffix = ",".join(variant["key"] for variant in experiment.feature_flag.variants)
 
     cache_key = generate_cache_key(
-        f"experiment_{results_type}_{cache_filter.toJSON()}_{experiment.team.pk}_{experiment.pk}{exposure_suffix}"
+        f"experiment_{results_type}_{cache_filter.toJSON()}_{experiment.team.pk}_{experiment.pk}_{variants_suffix}{exposure_suffix}"
     )
 
     tag_queries(cache_key=cache_key)
@@ -1575,6 +1575,76 @@ class ClickhouseTestFunnelExperimentResults(ClickhouseTestMixin, APILicensedTest
         self.assertEqual(response2_json.pop("is_cached"), True)
         self.assertEqual(response2_json["result"], response_data)
 
+    def test_experiment_results_are_recalculated_when_flag_variants_change(self):
+        journeys_for(
+            {
+                f"person_{variant}_{index}": [
+                    {
+                        "event": "$pageview",
+                        "timestamp": "2020-01-02",
+                        "properties": {"$feature/a-b-test": variant},
+                    },
+                    *(
+                        [
+                            {
+                                "event": "$pageleave",
+                                "timestamp": "2020-01-04",
+                                "properties": {"$feature/a-b-test": variant},
+                            }
+                        ]
+                        if index == 0
+                        else []
+                    ),
+                ]
+                for variant in ("control", "test", "test_2")
+                for index in range(2)
+            },
+            self.team,
+        )
+
+        ff_key = "a-b-test"
+        response = self.client.post(
+            f"/api/projects/{self.team.id}/experiments/",
+            {
+                "name": "Test Experiment",
+                "description": "",
+                "start_date": "2020-01-01T00:00",
+                "end_date": "2020-01-06T00:00",
+                "feature_flag_key": ff_key,
+                "parameters": None,
+                "filters": {
+                    "insight": "funnels",
+                    "events": [
+                        {"order": 0, "id": "$pageview"},
+                        {"order": 1, "id": "$pageleave"},
+                    ],
+                    "properties": [],
+                },
+            },
+        )
+        id = response.json()["id"]
+
+        response = self.client.get(f"/api/projects/{self.team.id}/experiments/{id}/results")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(response.json()["is_cached"], False)
+        self.assertEqual(set(response.json()["result"]["probability"]), {"control", "test"})
+
+        response = self.client.get(f"/api/projects/{self.team.id}/experiments/{id}/results")
+        self.assertEqual(response.json()["is_cached"], True)
+
+        feature_flag = FeatureFlag.objects.get(team=self.team, key=ff_key)
+        feature_flag.filters["multivariate"]["variants"] = [
+            {"key": "control", "name": "Control Group", "rollout_percentage": 34},
+            {"key": "test", "name": "Test Variant", "rollout_percentage": 33},
+            {"key": "test_2", "name": "Second Test Variant", "rollout_percentage": 33},
+        ]
+        feature_flag.save()
+
+        response = self.client.get(f"/api/projects/{self.team.id}/experiments/{id}/results")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(response.json()["is_cached"], False)
+        self.assertEqual(set(response.json()["result"]["probability"]), {"control", "test", "test_2"})
+
     @snapshot_clickhouse_queries
     def test_experiment_flow_with_event_results_and_events_out_of_time_range_timezones(self):
         journeys_for(
@@ -65,6 +65,10 @@ MATERIALIZE_COLUMNS_MAX_AT_ONCE = get_from_env("MATERIALIZE_COLUMNS_MAX_AT_ONCE"
 
 BILLING_SERVICE_URL = get_from_env("BILLING_SERVICE_URL", "https://billing.posthog.com")
 
+# Threads to draw experiment variant posterior samples on. 0 draws them on the calling thread.
+# Beta sampling releases the GIL, so this only pays off for many-variant experiments on multi-core hosts.
+EXPERIMENT_SAMPLING_THREADS = get_from_env("EXPERIMENT_SAMPLING_THREADS", 0, type_cast=int)
+
 # Whether to enable the admin portal. Default false for self-hosted as if not setup properly can pose security issues.
 ADMIN_PORTAL_ENABLED = get_from_env("ADMIN_PORTAL_ENABLED", DEMO or DEBUG, type_cast=str_to_bool)
 
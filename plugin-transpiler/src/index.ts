@@ -1,9 +1,79 @@
 import { transform } from '@babel/standalone'
 import { presets } from './presets'
 
-process.stdin.setEncoding('utf8')
+type AppType = 'site' | 'frontend'
 
-let type: 'site' | 'frontend' = 'site'
+function transpile(code: string, type: AppType): string {
+    const { wrapper, ...options } = presets[type]
+    let output = transform(code, options).code
+    if (!output) {
+        throw new Error('Could not transpile code')
+    }
+    if (wrapper) {
+        output = wrapper(output)
+    }
+    return output
+}
+
+function writeFrame(message: Record<string, any>): void {
+    const body = Buffer.from(JSON.stringify(message), 'utf8')
+    const header = Buffer.alloc(4)
+    header.writeUInt32BE(body.length)
+    process.stdout.write(Buffer.concat([header, body]))
+}
+
+// Long-lived mode: read length-prefixed JSON `{ type, source }` requests from stdin,
+// and reply to each with a length-prefixed JSON `{ transpiled }` or `{ error }`.
+function runServer(): void {
+    let buffer = Buffer.alloc(0)
+    process.stdin.on('data', (chunk: Buffer) => {
+        buffer = Buffer.concat([buffer, chunk])
+        while (buffer.length >= 4) {
+            const length = buffer.readUInt32BE(0)
+            if (buffer.length < 4 + length) {
+                break
+            }
+            const body = buffer.subarray(4, 4 + length).toString('utf8')
+            buffer = buffer.subarray(4 + length)
+
+            try {
+                const { type, source } = JSON.parse(body)
+                if (type !== 'site' && type !== 'frontend') {
+                    throw new Error(`Unknown app type: ${type}`)
+                }
+                writeFrame({ transpiled: transpile(source, type) })
+            } catch (error: any) {
+                // same text the one-shot mode prints to stderr
+                writeFrame({ error: `${error.message}\n` })
+            }
+        }
+    })
+    process.stdin.on('end', () => process.exit(0))
+}
+
+function runOnce(type: AppType): void {
+    process.stdin.setEncoding('utf8')
+
+    let code = ''
+    process.stdin.on('readable', () => {
+        let chunk: string | Buffer
+        while ((chunk = process.stdin.read())) {
+            code += chunk
+        }
+    })
+
+    process.stdin.on('end', () => {
+        try {
+            process.stdout.write(transpile(code, type), 'utf8')
+        } catch (error: any) {
+            console.error(error.message)
+            process.exit(1)
+        }
+    })
+}
+
+let type: AppType = 'site'
+let server = false
 
 for (let i = 2; i < process.argv.length; i++) {
     const arg = process.argv[i]
@@ -13,34 +83,16 @@ for (let i = 2; i < process.argv.length; i++) {
             console.error(`Unknown app type: ${type}`)
             process.exit(1)
         }
+    } else if (arg === '--server') {
+        server = true
     } else {
         console.error(`Unknown argument: ${arg}`)
         process.exit(1)
     }
 }
-const { wrapper, ...options } = presets[type]
 
-let code = ''
-process.stdin.on('readable', () => {
-    let chunk: string | Buffer
-    while ((chunk = process.stdin.read())) {
-        code += chunk
-    }
-})
-
-process.stdin.on('end', () => {
-    try {
-        let output = transform(code, options).code
-        if (output) {
-            if (wrapper) {
-                output = wrapper(output)
-            }
-            process.stdout.write(output, 'utf8')
-        } else {
-            throw new Error('Could not transpile code')
-        }
-    } catch (error: any) {
-        console.error(error.message)
-        process.exit(1)
-    }
-})
+if (server) {
+    runServer()
+} else {
+    runOnce(type)
+}
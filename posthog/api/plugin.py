@@ -1,15 +1,16 @@
+import hashlib
 import json
-import os
 import re
-import subprocess
-from typing import Any, Dict, List, Optional, Set, cast, Literal
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple, cast, Literal
 
+import orjson
 import requests
 from dateutil.relativedelta import relativedelta
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
 from django.core.files.uploadedfile import UploadedFile
 from django.db import connections, transaction
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Prefetch, Q
 from django.http import HttpResponse
 from django.utils.encoding import smart_str
 from django.utils.timezone import now
@@ -23,10 +24,13 @@ from rest_framework.response import Response
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.models import Plugin, PluginAttachment, PluginConfig, User
 from posthog.models.activity_logging.activity_log import (
+    ActivityLog,
     ActivityPage,
     Change,
     Detail,
     Trigger,
+    build_activity_log,
+    bulk_log_activity,
     dict_changes_between,
     load_all_activity,
     log_activity,
@@ -45,27 +49,163 @@ from posthog.permissions import (
     ProjectMembershipNecessaryPermissions,
     TeamMemberAccessPermission,
 )
-from posthog.plugins import can_configure_plugins, can_install_plugins, parse_url
+from posthog.plugins import can_configure_plugins, can_install_plugins, parse_url, reload_plugins_on_workers
 from posthog.plugins.access import can_globally_manage_plugins
+from posthog.plugins.transpiler import get_transpiler_pool
 from posthog.queries.app_metrics.app_metrics import TeamPluginsDeliveryRateQuery
 from posthog.redis import get_client
-from posthog.utils import format_query_params_absolute_url
+from posthog.tasks.plugin_source import transpile_plugin_source_file
+from posthog.utils import format_query_params_absolute_url, str_to_bool
 
 
 # Keep this in sync with: frontend/scenes/plugins/utils.ts
 SECRET_FIELD_VALUE = "**************** POSTHOG SECRET FIELD ****************"
 
+# The public plugin repository listing changes rarely, so don't fetch it from GitHub on every request
+PLUGIN_REPOSITORY_CACHE_KEY = "plugin_repository"
+PLUGIN_REPOSITORY_CACHE_TTL = 5 * 60
+
+ADD_ATTACHMENT_KEY_REGEX = re.compile(r"^add_attachment\[([^]]+)\]$")
+REMOVE_ATTACHMENT_KEY_REGEX = re.compile(r"^remove_attachment\[([^]]+)\]$")
+
+# Attachment fields returned in plugin config responses, so the contents blob is never loaded for them
+PLUGIN_ATTACHMENT_INFO_FIELDS = ("id", "key", "file_size", "file_name", "content_type")
+
+
+def _get_attachment_content_hash(contents: bytes) -> str:
+    return hashlib.blake2b(contents, digest_size=16).hexdigest()
+
 
 def _update_plugin_attachments(request: request.Request, plugin_config: PluginConfig):
-    user = cast(User, request.user)
+    files_to_add: Dict[str, UploadedFile] = {}
     for key, file in request.FILES.items():
-        match = re.match(r"^add_attachment\[([^]]+)\]$", key)
+        match = ADD_ATTACHMENT_KEY_REGEX.match(key)
         if match:
-            _update_plugin_attachment(request, plugin_config, match.group(1), file, user)
+            files_to_add[match.group(1)] = file
+    keys_to_remove: Set[str] = set()
     for key, _file in request.POST.items():
-        match = re.match(r"^remove_attachment\[([^]]+)\]$", key)
+        match = REMOVE_ATTACHMENT_KEY_REGEX.match(key)
         if match:
-            _update_plugin_attachment(request, plugin_config, match.group(1), None, user)
+            keys_to_remove.add(match.group(1))
+    if not files_to_add and not keys_to_remove:
+        return
+
+    # The stored contents are only ever replaced or deleted here, so don't load the old blobs
+    existing_attachments = {
+        attachment.key: attachment
+        for attachment in PluginAttachment.objects.defer("contents").filter(
+            team_id=plugin_config.team_id, plugin_config=plugin_config, key__in=[*files_to_add, *keys_to_remove]
+        )
+    }
+
+    attachments_to_create: List[PluginAttachment] = []
+    # Re-uploads of an identical file only touch the metadata, everything else rewrites the contents too
+    attachments_to_update_metadata: List[PluginAttachment] = []
+    attachments_to_update_contents: List[PluginAttachment] = []
+    attachment_ids_to_delete: List[int] = []
+    activity_changes: List[Tuple[str, Change]] = []
+
+    for key, file in files_to_add.items():
+        if key in keys_to_remove:
+            # Removal wins, as it was applied after the upload when attachments were handled one by one
+            continue
+        contents = file.file.read()
+        content_hash = _get_attachment_content_hash(contents)
+        plugin_attachment = existing_attachments.get(key)
+        if plugin_attachment is None:
+            attachments_to_create.append(
+                PluginAttachment(
+                    team_id=plugin_config.team_id,
+                    plugin_config=plugin_config,
+                    key=key,
+                    content_type=str(file.content_type),
+                    file_name=file.name,
+                    file_size=file.size,
+                    contents=contents,
+                    content_hash=content_hash,
+                )
+            )
+            activity_changes.append(
+                ("attachment_created", Change(type="PluginConfig", action="created", before=None, after=file.name))
+            )
+            continue
+
+        activity_changes.append(
+            (
+                "attachment_updated",
+                Change(
+                    type="PluginConfig",
+                    action="changed",
+                    before=plugin_attachment.file_name,
+                    after=file.name,
+                ),
+            )
+        )
+        plugin_attachment.content_type = file.content_type
+        plugin_attachment.file_name = file.name
+        plugin_attachment.file_size = file.size
+        if content_hash == plugin_attachment.content_hash:
+            attachments_to_update_metadata.append(plugin_attachment)
+        else:
+            plugin_attachment.contents = contents
+            plugin_attachment.content_hash = content_hash
+            attachments_to_update_contents.append(plugin_attachment)
+
+    for key in keys_to_remove:
+        plugin_attachment = existing_attachments.get(key)
+        if plugin_attachment is None:
+            continue
+        attachment_ids_to_delete.append(plugin_attachment.id)
+        activity_changes.append(
+            (
+                "attachment_deleted",
+                Change(
+                    type="PluginConfig",
+                    action="deleted",
+                    before=plugin_attachment.file_name,
+                    after=None,
+                ),
+            )
+        )
+
+    with transaction.atomic():
+        if attachment_ids_to_delete:
+            # A plain delete() would re-select every row, contents included, to send post_delete for each of them.
+            # Nothing references attachments, so one DELETE is enough, and the single reload below covers it.
+            attachments_to_delete = PluginAttachment.objects.filter(id__in=attachment_ids_to_delete)
+            attachments_to_delete._raw_delete(attachments_to_delete.db)
+        if attachments_to_update_metadata:
+            PluginAttachment.objects.bulk_update(
+                attachments_to_update_metadata, ["content_type", "file_name", "file_size"]
+            )
+        if attachments_to_update_contents:
+            PluginAttachment.objects.bulk_update(
+                attachments_to_update_contents,
+                ["content_type", "file_name", "file_size", "contents", "content_hash"],
+            )
+        if attachments_to_create:
+            PluginAttachment.objects.bulk_create(attachments_to_create)
+    # Bulk and raw writes skip the receivers that reload plugins, so reload once for the whole request
+    if (
+        attachments_to_create
+        or attachments_to_update_metadata
+        or attachments_to_update_contents
+        or attachment_ids_to_delete
+    ):
+        reload_plugins_on_workers()
+
+    user = cast(User, request.user)
+    for activity, change in activity_changes:
+        log_activity(
+            organization_id=plugin_config.team.organization_id,
+            team_id=plugin_config.team_id,
+            user=user,
+            was_impersonated=is_impersonated_session(request),
+            item_id=plugin_config.id,
+            scope="PluginConfig",
+            activity=activity,
+            detail=Detail(name=plugin_config.plugin.name, changes=[change]),
+        )
 
 
 def get_plugin_config_changes(old_config: Dict[str, Any], new_config: Dict[str, Any], secret_fields=[]) -> List[Change]:
@@ -88,9 +228,9 @@ def log_enabled_change_activity(
 ):
     if old_enabled != new_plugin_config.enabled:
         log_activity(
-            organization_id=new_plugin_config.team.organization.id,
+            organization_id=new_plugin_config.team.organization_id,
             # Users in an org but not yet in a team can technically manage plugins via the API
-            team_id=new_plugin_config.team.id,
+            team_id=new_plugin_config.team_id,
             user=user,
             was_impersonated=was_impersonated,
             item_id=new_plugin_config.id,
@@ -116,9 +256,9 @@ def log_config_update_activity(
 
     if len(config_changes) > 0:
         log_activity(
-            organization_id=new_plugin_config.team.organization.id,
+            organization_id=new_plugin_config.team.organization_id,
             # Users in an org but not yet in a team can technically manage plugins via the API
-            team_id=new_plugin_config.team.id,
+            team_id=new_plugin_config.team_id,
             user=user,
             was_impersonated=was_impersonated,
             item_id=new_plugin_config.id,
@@ -132,62 +272,6 @@ def log_config_update_activity(
     )
 
 
-def _update_plugin_attachment(
-    request: request.Request, plugin_config: PluginConfig, key: str, file: Optional[UploadedFile], user: User
-):
-    try:
-        plugin_attachment = PluginAttachment.objects.get(team=plugin_config.team, plugin_config=plugin_config, key=key)
-        if file:
-            activity = "attachment_updated"
-            change = Change(
-                type="PluginConfig",
-                action="changed",
-                before=plugin_attachment.file_name,
-                after=file.name,
-            )
-
-            plugin_attachment.content_type = file.content_type
-            plugin_attachment.file_name = file.name
-            plugin_attachment.file_size = file.size
-            plugin_attachment.contents = file.file.read()
-            plugin_attachment.save()
-        else:
-            plugin_attachment.delete()
-
-            activity = "attachment_deleted"
-            change = Change(
-                type="PluginConfig",
-                action="deleted",
-                before=plugin_attachment.file_name,
-                after=None,
-            )
-    except ObjectDoesNotExist:
-        if file:
-            PluginAttachment.objects.create(
-                team=plugin_config.team,
-                plugin_config=plugin_config,
-                key=key,
-                content_type=str(file.content_type),
-                file_name=file.name,
-                file_size=file.size,
-                contents=file.file.read(),
-            )
-
-            activity = "attachment_created"
-            change = Change(type="PluginConfig", action="created", before=None, after=file.name)
-
-    log_activity(
-        organization_id=plugin_config.team.organization.id,
-        team_id=plugin_config.team.id,
-        user=user,
-        was_impersonated=is_impersonated_session(request),
-        item_id=plugin_config.id,
-        scope="PluginConfig",
-        activity=activity,
-        detail=Detail(name=plugin_config.plugin.name, changes=[change]),
-    )
-
-
 # sending files via a multipart form puts the config JSON in a un-serialized format
 def _fix_formdata_config_json(request: request.Request, validated_data: dict):
     if not validated_data.get("config", None) and cast(dict, request.POST).get("config", None):
@@ -195,21 +279,34 @@ def _fix_formdata_config_json(request: request.Request, validated_data: dict):
 
 
 def transpile(input_string: str, type: Literal["site", "frontend"] = "site") -> Optional[str]:
-    from posthog.settings.base_variables import BASE_DIR
-
-    transpiler_path = os.path.join(BASE_DIR, "plugin-transpiler/dist/index.js")
     if type not in ["site", "frontend"]:
         raise Exception('Invalid type. Must be "site" or "frontend".')
 
-    process = subprocess.Popen(
-        ["node", transpiler_path, "--type", type], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-    )
-    stdout, stderr = process.communicate(input=input_string.encode())
+    # Reuses warm Node processes, starting one per call costs more than the transpilation itself
+    return get_transpiler_pool().transpile(input_string, type)
+
 
-    if process.returncode != 0:
-        error = stderr.decode()
-        raise Exception(error)
-    return stdout.decode()
+# Source files that get transpiled on save, and the transpiler preset used for each
+TRANSPILED_SOURCE_FILES: Dict[str, Literal["site", "frontend"]] = {"site.ts": "site", "frontend.tsx": "frontend"}
+
+# Transpiled source, error and status to store for a source file
+TranspilationResult = Tuple[Optional[str], Optional[str], Optional[PluginSourceFile.Status]]
+
+
+def _transpile_source_file(filename: str, source: str) -> TranspilationResult:
+    try:
+        return transpile(source, type=TRANSPILED_SOURCE_FILES[filename]), None, PluginSourceFile.Status.TRANSPILED
+    except Exception as e:
+        return None, str(e), PluginSourceFile.Status.ERROR
+
+
+def _transpile_source_files(files: List[Tuple[str, str]]) -> Dict[str, TranspilationResult]:
+    if len(files) < 2:
+        return {filename: _transpile_source_file(filename, source) for filename, source in files}
+    # Transpiling waits on the Node subprocess, so the files can be transpiled concurrently
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        results = executor.map(lambda file: _transpile_source_file(*file), files)
+        return dict(zip((filename for filename, _ in files), results))
 
 
 class PlainRenderer(renderers.BaseRenderer):
@@ -315,6 +412,9 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         queryset = queryset.select_related("organization")
+        if self.action in ("list", "retrieve"):
+            # Not serialized, and the archive can be a sizeable zip
+            queryset = queryset.defer("archive", "source")
 
         if self.action == "get" or self.action == "list":
             if can_install_plugins(self.organization) or can_configure_plugins(self.organization):
@@ -349,14 +449,20 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
 
     @action(methods=["GET"], detail=False)
     def repository(self, request: request.Request, **kwargs):
-        url = "https://raw.githubusercontent.com/PostHog/integrations-repository/main/plugins.json"
-        plugins = requests.get(url)
-        return Response(json.loads(plugins.text))
+        repository = cache.get(PLUGIN_REPOSITORY_CACHE_KEY)
+        if repository is None:
+            url = "https://raw.githubusercontent.com/PostHog/integrations-repository/main/plugins.json"
+            plugins = requests.get(url, timeout=10)
+            repository = orjson.loads(plugins.text)
+            if plugins.status_code == 200:
+                cache.set(PLUGIN_REPOSITORY_CACHE_KEY, repository, PLUGIN_REPOSITORY_CACHE_TTL)
+        return Response(repository)
 
     @action(methods=["GET"], detail=False)
     def unused(self, request: request.Request, **kwargs):
-        ids = Plugin.objects.exclude(
-            id__in=PluginConfig.objects.filter(enabled=True).values_list("plugin_id", flat=True)
+        # NOT EXISTS rather than NOT IN, so that Postgres can plan an anti-join
+        ids = Plugin.objects.filter(
+            ~Exists(PluginConfig.objects.filter(plugin_id=OuterRef("pk"), enabled=True))
         ).values_list("id", flat=True)
         return Response(ids)
 
@@ -376,12 +482,13 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         plugin = self.get_plugin_with_permissions(reason="installation")
         latest_url = parse_url(plugin.url, get_latest_if_none=True)
 
+        plugin.latest_tag = latest_url.get("tag", latest_url.get("version", None))
+        plugin.latest_tag_checked_at = now()
         # use update to not trigger the post_save signal and avoid telling the plugin server to reload vms
         Plugin.objects.filter(id=plugin.id).update(
-            latest_tag=latest_url.get("tag", latest_url.get("version", None)),
-            latest_tag_checked_at=now(),
+            latest_tag=plugin.latest_tag,
+            latest_tag_checked_at=plugin.latest_tag_checked_at,
         )
-        plugin.refresh_from_db()
 
         return Response({"plugin": PluginSerializer(plugin).data})
 
@@ -400,44 +507,60 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         performed_changes = False
         for plugin_source_file in PluginSourceFile.objects.filter(plugin=plugin):
             sources[plugin_source_file.filename] = plugin_source_file
+        # With ?async=1 changed files are stored untranspiled (status null) and transpiled by a celery task
+        transpile_async = str_to_bool(request.query_params.get("async", False))
+        transpiled_files = (
+            {}
+            if transpile_async
+            else _transpile_source_files(
+                [(key, source) for key, source in request.data.items() if key in TRANSPILED_SOURCE_FILES]
+            )
+        )
+        files_to_create: List[PluginSourceFile] = []
+        files_to_update: List[PluginSourceFile] = []
+        filenames_to_delete: List[str] = []
         for key, source in request.data.items():
-            transpiled = None
-            error = None
-            status = None
-            try:
-                if key == "site.ts":
-                    transpiled = transpile(source, type="site")
-                    status = PluginSourceFile.Status.TRANSPILED
-                elif key == "frontend.tsx":
-                    transpiled = transpile(source, type="frontend")
-                    status = PluginSourceFile.Status.TRANSPILED
-            except Exception as e:
-                error = str(e)
-                status = PluginSourceFile.Status.ERROR
+            if transpile_async and key in sources and sources[key].source == source:
+                transpiled, error, status = sources[key].transpiled, sources[key].error, sources[key].status
+            else:
+                transpiled, error, status = transpiled_files.get(key, (None, None, None))
 
             if key not in sources:
                 performed_changes = True
-                sources[key], created = PluginSourceFile.objects.update_or_create(
+                sources[key] = PluginSourceFile(
                     plugin=plugin,
                     filename=key,
-                    defaults={
-                        "source": source,
-                        "transpiled": transpiled,
-                        "status": status,
-                        "error": error,
-                    },
+                    source=source,
+                    transpiled=transpiled,
+                    status=status,
+                    error=error,
                 )
+                files_to_create.append(sources[key])
             elif sources[key].source != source or sources[key].transpiled != transpiled or sources[key].error != error:
                 performed_changes = True
                 if source is None:
-                    sources[key].delete()
+                    filenames_to_delete.append(key)
                     del sources[key]
                 else:
                     sources[key].source = source
                     sources[key].transpiled = transpiled
                     sources[key].status = status
                     sources[key].error = error
-                    sources[key].save()
+                    files_to_update.append(sources[key])
+
+        # Write all source file changes in at most three queries
+        with transaction.atomic():
+            if filenames_to_delete:
+                PluginSourceFile.objects.filter(plugin=plugin, filename__in=filenames_to_delete).delete()
+            if files_to_update:
+                PluginSourceFile.objects.bulk_update(files_to_update, ["source", "transpiled", "status", "error"])
+            if files_to_create:
+                PluginSourceFile.objects.bulk_create(files_to_create)
+
+        if transpile_async:
+            for source_file in files_to_create + files_to_update:
+                if source_file.filename in TRANSPILED_SOURCE_FILES and source_file.status is None:
+                    transpile_plugin_source_file.delay(str(source_file.id))
 
         response: Dict[str, str] = {}
         for _, source in sources.items():
@@ -445,11 +568,11 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
 
         # Update values from plugin.json, if one exists
         if response.get("plugin.json"):
-            plugin_json = json.loads(response["plugin.json"])
+            plugin_json = orjson.loads(response["plugin.json"])
             if "name" in plugin_json and plugin_json["name"] != plugin.name:
                 plugin.name = plugin_json.get("name")
                 performed_changes = True
-            if "config" in plugin_json and json.dumps(plugin_json["config"]) != json.dumps(plugin.config_schema):
+            if "config" in plugin_json and plugin_json["config"] != plugin.config_schema:
                 plugin.config_schema = plugin_json["config"]
                 performed_changes = True
 
@@ -465,7 +588,7 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         # Trigger capabilities update in plugin server, in case the app source changed the methods etc
         get_client().publish(
             "populate-plugin-capabilities",
-            json.dumps({"plugin_id": str(plugin.id)}),
+            orjson.dumps({"plugin_id": str(plugin.id)}),
         )
         return Response(response)
 
@@ -513,7 +636,7 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         user = serializer.context["request"].user
 
         log_activity(
-            organization_id=serializer.instance.organization.id,
+            organization_id=serializer.instance.organization_id,
             # Users in an org but not yet in a team can technically manage plugins via the API
             team_id=user.team.id if user.team else 0,
             user=user,
@@ -557,6 +680,15 @@ class PluginViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         )
 
 
+def _prefetch_plugin_config_attachments() -> Prefetch:
+    # Read by PluginConfigSerializer.get_config in place of a query per config
+    return Prefetch(
+        "pluginattachment_set",
+        queryset=PluginAttachment.objects.only("plugin_config_id", *PLUGIN_ATTACHMENT_INFO_FIELDS),
+        to_attr="prefetched_attachments",
+    )
+
+
 class PluginConfigSerializer(serializers.ModelSerializer):
     config = serializers.SerializerMethodField()
     plugin_info = serializers.SerializerMethodField()
@@ -590,23 +722,33 @@ class PluginConfigSerializer(serializers.ModelSerializer):
             "created_at",
         ]
 
-    def get_config(self, plugin_config: PluginConfig):
-        attachments = PluginAttachment.objects.filter(plugin_config=plugin_config).only(
-            "id", "file_size", "file_name", "content_type"
-        )
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # When listing, one child serializer handles every row, so configs of the same plugin share this
+        self._secret_fields_cache: Dict[int, Set[str]] = {}
 
-        new_plugin_config = plugin_config.config.copy()
+    def _get_secret_fields(self, plugin: Plugin) -> Set[str]:
+        if plugin.id not in self._secret_fields_cache:
+            self._secret_fields_cache[plugin.id] = _get_secret_fields_for_plugin(plugin)
+        return self._secret_fields_cache[plugin.id]
 
-        secret_fields = _get_secret_fields_for_plugin(plugin_config.plugin)
+    def get_config(self, plugin_config: PluginConfig):
+        # set by _prefetch_plugin_config_attachments for list, retrieve and rearrange
+        attachments = getattr(plugin_config, "prefetched_attachments", None)
+        if attachments is None:
+            attachments = PluginAttachment.objects.filter(plugin_config=plugin_config).only(
+                *PLUGIN_ATTACHMENT_INFO_FIELDS
+            )
+
+        config = plugin_config.config
+        secret_fields = self._get_secret_fields(plugin_config.plugin)
 
         # do not send the real value to the client
-        for key in secret_fields:
-            if new_plugin_config.get(key):
-                new_plugin_config[key] = SECRET_FIELD_VALUE
+        overrides: Dict[str, Any] = {key: SECRET_FIELD_VALUE for key in secret_fields if config.get(key)}
 
         for attachment in attachments:
             if attachment.key not in secret_fields:
-                new_plugin_config[attachment.key] = {
+                overrides[attachment.key] = {
                     "uid": attachment.id,
                     "saved": True,
                     "size": attachment.file_size,
@@ -614,7 +756,7 @@ class PluginConfigSerializer(serializers.ModelSerializer):
                     "type": attachment.content_type,
                 }
             else:
-                new_plugin_config[attachment.key] = {
+                overrides[attachment.key] = {
                     "uid": -1,
                     "saved": True,
                     "size": -1,
@@ -622,7 +764,7 @@ class PluginConfigSerializer(serializers.ModelSerializer):
                     "type": "application/octet-stream",
                 }
 
-        return new_plugin_config
+        return {**config, **overrides}
 
     def to_representation(self, instance: Any) -> Any:
         representation = super().to_representation(instance)
@@ -655,9 +797,9 @@ class PluginConfigSerializer(serializers.ModelSerializer):
         _fix_formdata_config_json(self.context["request"], validated_data)
         existing_config = PluginConfig.objects.filter(
             team_id=validated_data["team_id"], plugin_id=validated_data["plugin"]
-        )
-        if existing_config.exists():
-            return self.update(existing_config.first(), validated_data)  # type: ignore
+        ).first()
+        if existing_config is not None:
+            return self.update(existing_config, validated_data)
 
         validated_data["web_token"] = generate_random_token()
         plugin_config = super().create(validated_data)
@@ -667,7 +809,7 @@ class PluginConfigSerializer(serializers.ModelSerializer):
             changes=get_plugin_config_changes(
                 old_config={},
                 new_config=plugin_config.config,
-                secret_fields=_get_secret_fields_for_plugin(plugin_config.plugin),
+                secret_fields=self._get_secret_fields(plugin_config.plugin),
             ),
             user=self.context["request"].user,
             was_impersonated=is_impersonated_session(self.context["request"]),
@@ -691,20 +833,20 @@ class PluginConfigSerializer(serializers.ModelSerializer):
             validated_data["enabled"] = False
 
         # Keep old value for secret fields if no new value in the request
-        secret_fields = _get_secret_fields_for_plugin(plugin_config.plugin)
+        secret_fields = self._get_secret_fields(plugin_config.plugin)
 
+        old_config = plugin_config.config or {}
         if "config" in validated_data:
-            for key in secret_fields:
-                if validated_data["config"].get(key) is None:  # explicitly checking None to allow ""
-                    validated_data["config"][key] = plugin_config.config.get(key)
+            new_config = validated_data["config"]
+            # explicitly checking None to allow ""
+            new_config.update({key: old_config.get(key) for key in secret_fields if new_config.get(key) is None})
 
-        old_config = plugin_config.config
         old_enabled = plugin_config.enabled
         response = super().update(plugin_config, validated_data)
 
         log_config_update_activity(
             new_plugin_config=plugin_config,
-            old_config=old_config or {},
+            old_config=old_config,
             old_enabled=old_enabled,
             secret_fields=secret_fields,
             user=self.context["request"].user,
@@ -728,9 +870,14 @@ class PluginConfigViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         if not can_configure_plugins(self.team.organization_id):
             return self.queryset.none()
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related("plugin")
         if self.action == "list":
             queryset = queryset.filter(deleted=False)
+        if self.action in ("list", "retrieve"):
+            # Read only, so the prefetched attachments can't go stale before serialization
+            queryset = queryset.defer("plugin__archive", "plugin__source").prefetch_related(
+                _prefetch_plugin_config_attachments()
+            )
         return queryset.order_by("order", "plugin_id")
 
     def get_serializer_context(self) -> Dict[str, Any]:
@@ -755,37 +902,62 @@ class PluginConfigViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
 
         orders = request.data.get("orders", {})
 
-        plugin_configs = PluginConfig.objects.filter(team_id=self.team.pk, enabled=True)
-        plugin_configs_dict = {p.plugin_id: p for p in plugin_configs}
-        for plugin_id, order in orders.items():
-            plugin_config = plugin_configs_dict.get(int(plugin_id), None)
-            if plugin_config and plugin_config.order != order:
-                old_order = plugin_config.order
-                plugin_config.order = order
-                plugin_config.save()
-
-                log_activity(
-                    organization_id=self.organization.id,
-                    # Users in an org but not yet in a team can technically manage plugins via the API
-                    team_id=self.team.id,
-                    user=request.user,  # type: ignore
-                    was_impersonated=is_impersonated_session(self.request),
-                    item_id=plugin_config.id,
-                    scope="Plugin",  # use the type plugin so we can also provide unified history
-                    activity="order_changed",
-                    detail=Detail(
-                        name=plugin_config.plugin.name,
-                        changes=[
-                            Change(
-                                type="Plugin",
-                                before=old_order,
-                                after=order,
-                                action="changed",
-                                field="order",
-                            )
-                        ],
-                    ),
-                )
+        # Lock the team's configs so concurrent rearranges apply one after the other instead of interleaving.
+        # The lock blocks rather than using skip_locked: skipping rows held by another rearrange would leave them
+        # out of plugin_configs, so bulk_update would only reorder part of the set and the response would miss them.
+        with transaction.atomic():
+            # Only the order is changed, so the response can be serialized from the same prefetched rows
+            plugin_configs = list(
+                PluginConfig.objects.filter(team_id=self.team.pk, enabled=True)
+                .select_for_update(of=("self",))
+                .select_related("plugin")
+                .defer("plugin__archive", "plugin__source")
+                .prefetch_related(_prefetch_plugin_config_attachments())
+            )
+            plugin_configs_dict = {p.plugin_id: p for p in plugin_configs}
+            changed_plugin_configs: List[PluginConfig] = []
+            activity_logs: List[Optional[ActivityLog]] = []
+            for plugin_id, order in orders.items():
+                plugin_config = plugin_configs_dict.get(int(plugin_id), None)
+                if plugin_config and plugin_config.order != order:
+                    old_order = plugin_config.order
+                    plugin_config.order = order
+                    # bulk_update skips auto_now, and the plugin server reloads configs whose updated_at changed
+                    plugin_config.updated_at = now()
+                    changed_plugin_configs.append(plugin_config)
+
+                    activity_logs.append(
+                        build_activity_log(
+                            organization_id=self.organization.id,
+                            # Users in an org but not yet in a team can technically manage plugins via the API
+                            team_id=self.team.id,
+                            user=request.user,  # type: ignore
+                            was_impersonated=is_impersonated_session(self.request),
+                            item_id=plugin_config.id,
+                            scope="Plugin",  # use the type plugin so we can also provide unified history
+                            activity="order_changed",
+                            detail=Detail(
+                                name=plugin_config.plugin.name,
+                                changes=[
+                                    Change(
+                                        type="Plugin",
+                                        before=old_order,
+                                        after=order,
+                                        action="changed",
+                                        field="order",
+                                    )
+                                ],
+                            ),
+                        )
+                    )
+
+            if changed_plugin_configs:
+                PluginConfig.objects.bulk_update(changed_plugin_configs, ["order", "updated_at"], batch_size=500)
+
+        if changed_plugin_configs:
+            # bulk_update skips the post_save receiver, one reload covers every reordered config
+            reload_plugins_on_workers()
+            bulk_log_activity(activity_logs)
 
         return Response(PluginConfigSerializer(plugin_configs, many=True).data)
 
@@ -814,14 +986,14 @@ class PluginConfigViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
             is_staff=request.user.is_staff or is_impersonated_session(request),
         )
 
-        payload_json = json.dumps(
+        payload_json = orjson.dumps(
             {
                 "type": job_type,
                 "payload": {**job_payload, **{"$operation": job_op, "$job_id": job_id}},
                 "pluginConfigId": plugin_config_id,
                 "pluginConfigTeam": self.team.pk,
             }
-        )
+        ).decode()
         sql = f"SELECT graphile_worker.add_job('pluginJob', %s)"
         params = [payload_json]
         try:
@@ -832,7 +1004,7 @@ class PluginConfigViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
             raise Exception(f"Failed to execute postgres sql={sql},\nparams={params},\nexception={str(e)}")
 
         log_activity(
-            organization_id=self.team.organization.id,
+            organization_id=self.team.organization_id,
             # Users in an org but not yet in a team can technically manage plugins via the API
             team_id=self.team.pk,
             user=request.user,  # type: ignore
@@ -841,7 +1013,7 @@ class PluginConfigViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
             scope="PluginConfig",  # use the type plugin so we can also provide unified history
             activity="job_triggered",
             detail=Detail(
-                name=self.get_object().plugin.name,
+                name=plugin_config.plugin.name,
                 trigger=Trigger(job_type=job_type, job_id=job_id, payload=job_payload),
             ),
         )
@@ -866,7 +1038,7 @@ class PluginConfigViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         else:
             obj = {"error": plugin_source.error or "Error Compiling Plugin"}
 
-        content = f"export function getFrontendApp () {'{'} return {json.dumps(obj)} {'}'}"
+        content = b"export function getFrontendApp () { return " + orjson.dumps(obj) + b" }"
         return HttpResponse(content, content_type="application/javascript; charset=UTF-8")
 
 
@@ -883,23 +1055,21 @@ class LegacyPluginConfigViewSet(PluginConfigViewSet):
 class PipelineTransformationsViewSet(PluginViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
-        return queryset.filter(Q(capabilities__has_key="methods") & Q(capabilities__methods__contains=["processEvent"]))
+        return queryset.filter(capabilities__contains={"methods": ["processEvent"]})
 
 
 class PipelineTransformationsConfigsViewSet(PluginConfigViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
-        return queryset.filter(
-            Q(plugin__capabilities__has_key="methods") & Q(plugin__capabilities__methods__contains=["processEvent"])
-        )
+        return queryset.filter(plugin__capabilities__contains={"methods": ["processEvent"]})
 
 
 class PipelineDestinationsViewSet(PluginViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         return queryset.filter(
-            Q(capabilities__has_key="methods")
-            & (Q(capabilities__methods__contains=["onEvent"]) | Q(capabilities__methods__contains=["composeWebhook"]))
+            Q(capabilities__contains={"methods": ["onEvent"]})
+            | Q(capabilities__contains={"methods": ["composeWebhook"]})
         )
 
 
@@ -907,9 +1077,6 @@ class PipelineDestinationsConfigsViewSet(PluginConfigViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         return queryset.filter(
-            Q(plugin__capabilities__has_key="methods")
-            & (
-                Q(plugin__capabilities__methods__contains=["onEvent"])
-                | Q(plugin__capabilities__methods__contains=["composeWebhook"])
-            )
+            Q(plugin__capabilities__contains={"methods": ["onEvent"]})
+            | Q(plugin__capabilities__contains={"methods": ["composeWebhook"]})
         )
@@ -1,4 +1,5 @@
 import base64
+import hashlib
 import json
 from datetime import datetime
 from typing import Dict, List, cast
@@ -12,6 +13,7 @@ from rest_framework import status
 from posthog.constants import FROZEN_POSTHOG_VERSION
 
 from posthog.models import Plugin, PluginAttachment, PluginConfig, PluginSourceFile
+from posthog.models.activity_logging.activity_log import ActivityLog
 from posthog.models.organization import Organization, OrganizationMembership
 from posthog.models.team.team import Team
 from posthog.plugins.access import (
@@ -27,6 +29,7 @@ from posthog.plugins.test.plugin_archives import (
     HELLO_WORLD_PLUGIN_SECRET_GITHUB_ZIP,
 )
 from posthog.queries.app_metrics.test.test_app_metrics import create_app_metric
+from posthog.tasks.plugin_source import transpile_plugin_source_file
 from posthog.test.base import APIBaseTest, QueryMatchingTest, snapshot_postgres_queries
 
 
@@ -796,6 +799,14 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
             plugin_source.error
             == '/frontend.tsx: Unexpected token, expected "," (1:27)\n\n> 1 | export const scene = { nam broken code foobar\n    |                            ^\n'
         )
+        response = self.client.get(f"/api/plugin_config/{plugin_config.id}/frontend")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.content.decode("utf-8"),
+            "export function getFrontendApp () { return "
+            + json.dumps({"error": plugin_source.error}, separators=(",", ":"))
+            + " }",
+        )
 
         # Deletes work
         self.client.patch(
@@ -822,6 +833,41 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
         )
         assert plugin_source.status == PluginSourceFile.Status.TRANSPILED
 
+    @patch("posthog.api.plugin.transpile_plugin_source_file.delay")
+    def test_transpile_plugin_source_async(self, mock_transpile_delay, mock_get, mock_reload):
+        response = self.client.post(
+            "/api/organizations/@current/plugins/",
+            {"plugin_type": "source", "name": "myplugin"},
+        )
+        id = response.json()["id"]
+
+        self.client.patch(
+            f"/api/organizations/@current/plugins/{id}/update_source?async=1",
+            {"site.ts": "console.log('hello')"},
+        )
+        plugin_source = PluginSourceFile.objects.get(plugin_id=id)
+        assert plugin_source.transpiled is None
+        assert plugin_source.status is None
+        mock_transpile_delay.assert_called_once_with(str(plugin_source.id))
+
+        transpile_plugin_source_file(str(plugin_source.id))
+        plugin_source.refresh_from_db()
+        assert plugin_source.error is None
+        assert (
+            plugin_source.transpiled
+            == "(function () {let exports={};\"use strict\";\n\nconsole.log('hello');;return exports;})"
+        )
+        assert plugin_source.status == PluginSourceFile.Status.TRANSPILED
+
+        # Saving the same source again doesn't reset the transpiled result
+        self.client.patch(
+            f"/api/organizations/@current/plugins/{id}/update_source?async=1",
+            {"site.ts": "console.log('hello')"},
+        )
+        plugin_source.refresh_from_db()
+        assert plugin_source.status == PluginSourceFile.Status.TRANSPILED
+        assert mock_transpile_delay.call_count == 1
+
     def test_plugin_repository(self, mock_get, mock_reload):
         response = self.client.get("/api/organizations/@current/plugins/repository/")
         self.assertEqual(response.status_code, 200)
@@ -847,6 +893,14 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
             ],
         )
 
+    def test_plugin_repository_is_cached(self, mock_get, mock_reload):
+        first_response = self.client.get("/api/organizations/@current/plugins/repository/")
+        second_response = self.client.get("/api/organizations/@current/plugins/repository/")
+
+        self.assertEqual(first_response.status_code, 200)
+        self.assertEqual(second_response.json(), first_response.json())
+        self.assertEqual(mock_get.call_count, 1)
+
     def test_plugin_unused(self, mock_get, mock_reload):
         plugin_no_configs = Plugin.objects.create(organization=self.organization)
         plugin_enabled = Plugin.objects.create(organization=self.organization)
@@ -954,6 +1008,58 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
             response_with_none.json(),
         )
 
+    @patch("posthog.api.plugin.reload_plugins_on_workers")
+    def test_rearrange_plugin_configs(self, mock_api_reload, mock_get, mock_reload):
+        plugin_1 = Plugin.objects.create(organization=self.organization, name="plugin 1")
+        plugin_2 = Plugin.objects.create(organization=self.organization, name="plugin 2")
+        plugin_config_1 = PluginConfig.objects.create(plugin=plugin_1, team=self.team, enabled=True, order=1)
+        plugin_config_2 = PluginConfig.objects.create(plugin=plugin_2, team=self.team, enabled=True, order=2)
+        previous_updated_at = plugin_config_1.updated_at
+
+        response = self.client.patch(
+            "/api/plugin_config/rearrange/",
+            {"orders": {str(plugin_1.id): 2, str(plugin_2.id): 2}},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        plugin_config_1.refresh_from_db()
+        plugin_config_2.refresh_from_db()
+        self.assertEqual(plugin_config_1.order, 2)
+        self.assertEqual(plugin_config_2.order, 2)
+        self.assertGreater(plugin_config_1.updated_at, previous_updated_at)
+        self.assertEqual(mock_api_reload.call_count, 1)
+        self.assertEqual(
+            list(ActivityLog.objects.filter(activity="order_changed").values_list("item_id", "detail__name")),
+            [(str(plugin_config_1.id), "plugin 1")],
+        )
+
+    def test_pipeline_destinations_filter_on_capabilities(self, mock_get, mock_reload):
+        on_event = Plugin.objects.create(
+            organization=self.organization, name="on event", capabilities={"methods": ["setupPlugin", "onEvent"]}
+        )
+        webhook = Plugin.objects.create(
+            organization=self.organization, name="webhook", capabilities={"methods": ["composeWebhook"]}
+        )
+        transformation = Plugin.objects.create(
+            organization=self.organization, name="transformation", capabilities={"methods": ["processEvent"]}
+        )
+        Plugin.objects.create(organization=self.organization, name="no methods", capabilities={})
+        PluginConfig.objects.create(plugin=on_event, team=self.team, enabled=True, order=1)
+        PluginConfig.objects.create(plugin=transformation, team=self.team, enabled=True, order=2)
+
+        response = self.client.get("/api/organizations/@current/pipeline_destinations/")
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual([plugin["id"] for plugin in response.json()["results"]], [on_event.id, webhook.id])
+
+        response = self.client.get("/api/organizations/@current/pipeline_transformations/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([plugin["id"] for plugin in response.json()["results"]], [transformation.id])
+
+        response = self.client.get(f"/api/projects/{self.team.id}/pipeline_destination_configs/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([config["plugin"] for config in response.json()["results"]], [on_event.id])
+
     def test_create_plugin_config(self, mock_get, mock_reload):
         self.assertEqual(mock_reload.call_count, 0)
         response = self.client.post(
@@ -1178,7 +1284,8 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
             response = self.client.delete(f"/api/plugin_config/{plugin_config_id}")
             self.assertEqual(response.status_code, 204)
 
-    def test_plugin_config_attachment(self, mock_get, mock_reload):
+    @patch("posthog.api.plugin.reload_plugins_on_workers")
+    def test_plugin_config_attachment(self, mock_api_reload, mock_get, mock_reload):
         tmp_file_1 = SimpleUploadedFile(
             "foo-database-1.db",
             base64.b64decode(HELLO_WORLD_PLUGIN_GITHUB_ZIP[1]),
@@ -1214,6 +1321,7 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
         )
         plugin_config_id = response.json()["id"]
         plugin_attachment_id = response.json()["config"]["foodb"]["uid"]
+        self.assertEqual(mock_api_reload.call_count, 1)
 
         response = self.client.get(f"/api/plugin_config/{plugin_config_id}")
         self.assertEqual(
@@ -1236,6 +1344,12 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
             format="multipart",
         )
         self.assertEqual(PluginAttachment.objects.count(), 1)
+        self.assertEqual(mock_api_reload.call_count, 2)
+        plugin_attachment = PluginAttachment.objects.get(pk=plugin_attachment_id)
+        self.assertEqual(
+            plugin_attachment.content_hash,
+            hashlib.blake2b(bytes(plugin_attachment.contents), digest_size=16).hexdigest(),
+        )
 
         self.assertEqual(
             response.json()["config"],
@@ -1258,6 +1372,7 @@ class TestPluginAPI(APIBaseTest, QueryMatchingTest):
         )
         self.assertEqual(response.json()["config"], {"bar": "moop"})
         self.assertEqual(PluginAttachment.objects.count(), 0)
+        self.assertEqual(mock_api_reload.call_count, 3)
 
         response = self.client.get("/api/organizations/@current/plugins/activity")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -1,6 +1,7 @@
 from enum import Enum
-import json
-from typing import List, Dict, Literal
+from itertools import chain
+import orjson
+from typing import Any, Callable, List, Dict, Literal
 from posthog.models.entity.entity import Entity as LegacyEntity
 from posthog.schema import (
     ActionsNode,
@@ -49,44 +50,48 @@ def is_property_with_operator(property: Dict):
 
 def clean_property(property: Dict):
     cleaned_property = {**property}
+    property_type = cleaned_property.get("type")
 
     # fix type typo
-    if cleaned_property.get("type") == "events":
-        cleaned_property["type"] = "event"
+    if property_type == "events":
+        property_type = "event"
+        cleaned_property["type"] = property_type
 
     # fix value key typo
     if cleaned_property.get("values") is not None and cleaned_property.get("value") is None:
         cleaned_property["value"] = cleaned_property.pop("values")
 
     # convert precalculated and static cohorts to cohorts
-    if cleaned_property.get("type") in ("precalculated-cohort", "static-cohort"):
-        cleaned_property["type"] = "cohort"
+    if property_type in ("precalculated-cohort", "static-cohort"):
+        property_type = "cohort"
+        cleaned_property["type"] = property_type
 
     # fix invalid property key for cohorts
-    if cleaned_property.get("type") == "cohort" and cleaned_property.get("key") != "id":
+    if property_type == "cohort" and cleaned_property.get("key") != "id":
         cleaned_property["key"] = "id"
 
+    with_operator = is_property_with_operator(cleaned_property)
+
     # set a default operator for properties that support it, but don't have an operator set
-    if is_property_with_operator(cleaned_property) and cleaned_property.get("operator") is None:
+    if with_operator and cleaned_property.get("operator") is None:
         cleaned_property["operator"] = "exact"
 
     # remove the operator for properties that don't support it, but have it set
-    if not is_property_with_operator(cleaned_property) and cleaned_property.get("operator") is not None:
+    if not with_operator and cleaned_property.get("operator") is not None:
         del cleaned_property["operator"]
 
     # remove none from values
-    if isinstance(cleaned_property.get("value"), List):
-        cleaned_property["value"] = list(filter(lambda x: x is not None, cleaned_property.get("value")))
+    value = cleaned_property.get("value")
+    if isinstance(value, list):
+        cleaned_property["value"] = [x for x in value if x is not None]
 
     # remove keys without concrete value
-    cleaned_property = {key: value for key, value in cleaned_property.items() if value is not None}
-
-    return cleaned_property
+    return {key: value for key, value in cleaned_property.items() if value is not None}
 
 
 # old style dict properties
 def is_old_style_properties(properties):
-    return isinstance(properties, Dict) and len(properties) == 1 and properties.get("type") not in ("AND", "OR")
+    return isinstance(properties, dict) and len(properties) == 1 and properties.get("type") not in ("AND", "OR")
 
 
 def transform_old_style_properties(properties):
@@ -114,19 +119,22 @@ def clean_entity_properties(properties: List[Dict] | None):
 
 def clean_property_group_filter_value(value: Dict):
     if value.get("type") in ("AND", "OR"):
-        value["values"] = map(clean_property_group_filter_value, value.get("values"))
+        value["values"] = [clean_property_group_filter_value(v) for v in value.get("values", [])]
         return value
     else:
         return clean_property(value)
 
 
 def clean_properties(properties: Dict):
-    properties["values"] = map(clean_property_group_filter_value, properties.get("values"))
+    properties["values"] = [clean_property_group_filter_value(v) for v in properties.get("values", [])]
     return properties
 
 
+CHART_DISPLAY_TYPES = frozenset(ChartDisplayType.__members__)
+
+
 def clean_display(display: str):
-    if display not in ChartDisplayType.__members__:
+    if display not in CHART_DISPLAY_TYPES:
         return None
     else:
         return display
@@ -138,16 +146,13 @@ def legacy_entity_to_node(
     """
     Takes a legacy entity and converts it into an EventsNode or ActionsNode.
     """
-    shared = {
+    shared: Dict[str, Any] = {
         "name": entity.name,
         "custom_name": entity.custom_name,
     }
 
     if include_properties:
-        shared = {
-            **shared,
-            "properties": clean_entity_properties(entity._data.get("properties", None)),
-        }
+        shared["properties"] = clean_entity_properties(entity._data.get("properties", None))
 
     if math_availability != MathAvailability.Unavailable:
         #  only trends and stickiness insights support math.
@@ -158,15 +163,12 @@ def legacy_entity_to_node(
             and math_availability == MathAvailability.ActorsOnly
             and entity.math not in actors_only_math_types
         ):
-            shared = {**shared, "math": BaseMathType.dau}
+            shared["math"] = BaseMathType.dau
         else:
-            shared = {
-                **shared,
-                "math": entity.math,
-                "math_property": entity.math_property,
-                "math_hogql": entity.math_hogql,
-                "math_group_type_index": entity.math_group_type_index,
-            }
+            shared["math"] = entity.math
+            shared["math_property"] = entity.math_property
+            shared["math_hogql"] = entity.math_hogql
+            shared["math_group_type_index"] = entity.math_group_type_index
 
     if entity.type == "actions":
         return ActionsNode(id=entity.id, **shared)
@@ -227,8 +229,8 @@ def _date_range(filter: Dict):
     return {"dateRange": date_range}
 
 
-def _interval(filter: Dict):
-    if _insight_type(filter) == "RETENTION" or _insight_type(filter) == "PATHS":
+def _interval(filter: Dict, insight_type: INSIGHT_TYPE):
+    if insight_type == "RETENTION" or insight_type == "PATHS":
         return {}
 
     if filter.get("interval") == "minute":
@@ -237,8 +239,8 @@ def _interval(filter: Dict):
     return {"interval": filter.get("interval")}
 
 
-def _series(filter: Dict):
-    if _insight_type(filter) == "RETENTION" or _insight_type(filter) == "PATHS":
+def _series(filter: Dict, insight_type: INSIGHT_TYPE):
+    if insight_type == "RETENTION" or insight_type == "PATHS":
         return {}
 
     # remove templates gone wrong
@@ -248,9 +250,9 @@ def _series(filter: Dict):
     math_availability: MathAvailability = MathAvailability.Unavailable
     include_properties: bool = True
 
-    if _insight_type(filter) == "TRENDS":
+    if insight_type == "TRENDS":
         math_availability = MathAvailability.All
-    elif _insight_type(filter) == "STICKINESS":
+    elif insight_type == "STICKINESS":
         math_availability = MathAvailability.ActorsOnly
 
     return {
@@ -263,22 +265,24 @@ def _series(filter: Dict):
 
 
 def _entities(filter: Dict):
-    processed_entities: List[LegacyEntity] = []
-
-    # add actions
     actions = filter.get("actions", [])
     if isinstance(actions, str):
-        actions = json.loads(actions)
-    processed_entities.extend([LegacyEntity({**entity, "type": "actions"}) for entity in actions])
+        actions = orjson.loads(actions)
 
-    # add events
     events = filter.get("events", [])
     if isinstance(events, str):
-        events = json.loads(events)
-    processed_entities.extend([LegacyEntity({**entity, "type": "events"}) for entity in events])
+        events = orjson.loads(events)
+
+    # add actions, then events
+    processed_entities: List[LegacyEntity] = list(
+        chain(
+            (LegacyEntity(dict(entity, type="actions")) for entity in actions),
+            (LegacyEntity(dict(entity, type="events")) for entity in events),
+        )
+    )
 
     # order by order
-    processed_entities.sort(key=lambda entity: entity.order if entity.order else -1)
+    processed_entities.sort(key=lambda entity: entity.order or -1)
 
     # set sequential index values on entities
     for index, entity in enumerate(processed_entities):
@@ -322,8 +326,8 @@ def _properties(filter: Dict):
         return {"properties": PropertyGroupFilter(**clean_properties(raw_properties))}
 
 
-def _breakdown_filter(_filter: Dict):
-    if _insight_type(_filter) != "TRENDS" and _insight_type(_filter) != "FUNNELS":
+def _breakdown_filter(_filter: Dict, insight_type: INSIGHT_TYPE):
+    if insight_type != "TRENDS" and insight_type != "FUNNELS":
         return {}
 
     # early return for broken breakdown filters
@@ -337,7 +341,7 @@ def _breakdown_filter(_filter: Dict):
         "breakdown_group_type_index": _filter.get("breakdown_group_type_index"),
         "breakdown_hide_other_aggregation": _filter.get("breakdown_hide_other_aggregation"),
         "breakdown_histogram_bin_count": _filter.get("breakdown_histogram_bin_count")
-        if _insight_type(_filter) == "TRENDS"
+        if insight_type == "TRENDS"
         else None,
     }
 
@@ -356,110 +360,135 @@ def _breakdown_filter(_filter: Dict):
         breakdownFilter["breakdown_type"] = "event"
 
     if isinstance(breakdownFilter["breakdown"], list):
-        breakdownFilter["breakdown"] = list(filter(lambda x: x is not None, breakdownFilter["breakdown"]))
+        breakdownFilter["breakdown"] = [x for x in breakdownFilter["breakdown"] if x is not None]
 
-    if len(BreakdownFilter(**breakdownFilter).model_dump(exclude_defaults=True)) == 0:
+    breakdown_filter = BreakdownFilter(**breakdownFilter)
+    if len(breakdown_filter.model_dump(exclude_defaults=True)) == 0:
         return {}
 
-    return {"breakdownFilter": BreakdownFilter(**breakdownFilter)}
+    return {"breakdownFilter": breakdown_filter}
 
 
-def _group_aggregation_filter(filter: Dict):
-    if _insight_type(filter) == "STICKINESS" or _insight_type(filter) == "LIFECYCLE":
+def _group_aggregation_filter(filter: Dict, insight_type: INSIGHT_TYPE):
+    if insight_type == "STICKINESS" or insight_type == "LIFECYCLE":
         return {}
     return {"aggregation_group_type_index": filter.get("aggregation_group_type_index")}
 
 
-def _insight_filter(filter: Dict):
-    if _insight_type(filter) == "TRENDS":
-        insight_filter = {
-            "trendsFilter": TrendsFilter(
-                smoothingIntervals=filter.get("smoothing_intervals"),
-                showLegend=filter.get("show_legend"),
-                # hidden_legend_indexes=cleanHiddenLegendIndexes(filter.get('hidden_legend_keys')),
-                compare=filter.get("compare"),
-                aggregationAxisFormat=filter.get("aggregation_axis_format"),
-                aggregationAxisPrefix=filter.get("aggregation_axis_prefix"),
-                aggregationAxisPostfix=filter.get("aggregation_axis_postfix"),
-                decimalPlaces=filter.get("decimal_places"),
-                formula=filter.get("formula"),
-                display=clean_display(filter.get("display")),
-                showValuesOnSeries=filter.get("show_values_on_series"),
-                showPercentStackView=filter.get("show_percent_stack_view"),
-                showLabelsOnSeries=filter.get("show_label_on_series"),
-            )
-        }
-    elif _insight_type(filter) == "FUNNELS":
-        insight_filter = {
-            "funnelsFilter": FunnelsFilter(
-                funnelVizType=filter.get("funnel_viz_type"),
-                funnelOrderType=filter.get("funnel_order_type"),
-                funnelFromStep=filter.get("funnel_from_step"),
-                funnelToStep=filter.get("funnel_to_step"),
-                funnelWindowIntervalUnit=filter.get("funnel_window_interval_unit"),
-                funnelWindowInterval=filter.get("funnel_window_interval"),
-                funnelStepReference=filter.get("funnel_step_reference"),
-                breakdownAttributionType=filter.get("breakdown_attribution_type"),
-                breakdownAttributionValue=filter.get("breakdown_attribution_value"),
-                binCount=filter.get("bin_count"),
-                exclusions=[exlusion_entity_to_node(entity) for entity in filter.get("exclusions", [])],
-                layout=filter.get("layout"),
-                # hidden_legend_breakdowns: cleanHiddenLegendSeries(filter.get('hidden_legend_keys')),
-                funnelAggregateByHogQL=filter.get("funnel_aggregate_by_hogql"),
-            ),
-        }
-    elif _insight_type(filter) == "RETENTION":
-        insight_filter = {
-            "retentionFilter": RetentionFilter(
-                retentionType=filter.get("retention_type"),
-                retentionReference=filter.get("retention_reference"),
-                totalIntervals=filter.get("total_intervals"),
-                returningEntity=to_base_entity_dict(filter.get("returning_entity"))
-                if filter.get("returning_entity") is not None
-                else None,
-                targetEntity=to_base_entity_dict(filter.get("target_entity"))
-                if filter.get("target_entity") is not None
-                else None,
-                period=filter.get("period"),
-            )
-        }
-    elif _insight_type(filter) == "PATHS":
-        insight_filter = {
-            "pathsFilter": PathsFilter(
-                pathsHogQLExpression=filter.get("paths_hogql_expression"),
-                includeEventTypes=filter.get("include_event_types"),
-                startPoint=filter.get("start_point"),
-                endPoint=filter.get("end_point"),
-                pathGroupings=filter.get("path_groupings"),
-                excludeEvents=filter.get("exclude_events"),
-                stepLimit=filter.get("step_limit"),
-                pathReplacements=filter.get("path_replacements"),
-                localPathCleaningFilters=filter.get("local_path_cleaning_filters"),
-                edgeLimit=filter.get("edge_limit"),
-                minEdgeWeight=filter.get("min_edge_weight"),
-                maxEdgeWeight=filter.get("max_edge_weight"),
-                funnelPaths=filter.get("funnel_paths"),
-                funnelFilter=filter.get("funnel_filter"),
-            )
-        }
-    elif _insight_type(filter) == "LIFECYCLE":
-        insight_filter = {
-            "lifecycleFilter": LifecycleFilter(
-                toggledLifecycles=filter.get("toggledLifecycles"),
-                showValuesOnSeries=filter.get("show_values_on_series"),
-            )
-        }
-    elif _insight_type(filter) == "STICKINESS":
-        insight_filter = {
-            "stickinessFilter": StickinessFilter(
-                compare=filter.get("compare"),
-                showLegend=filter.get("show_legend"),
-                # hidden_legend_indexes: cleanHiddenLegendIndexes(filter.get('hidden_legend_keys')),
-                showValuesOnSeries=filter.get("show_values_on_series"),
-            )
-        }
-    else:
+def _trends_filter(filter: Dict):
+    return {
+        "trendsFilter": TrendsFilter(
+            smoothingIntervals=filter.get("smoothing_intervals"),
+            showLegend=filter.get("show_legend"),
+            # hidden_legend_indexes=cleanHiddenLegendIndexes(filter.get('hidden_legend_keys')),
+            compare=filter.get("compare"),
+            aggregationAxisFormat=filter.get("aggregation_axis_format"),
+            aggregationAxisPrefix=filter.get("aggregation_axis_prefix"),
+            aggregationAxisPostfix=filter.get("aggregation_axis_postfix"),
+            decimalPlaces=filter.get("decimal_places"),
+            formula=filter.get("formula"),
+            display=clean_display(filter.get("display")),
+            showValuesOnSeries=filter.get("show_values_on_series"),
+            showPercentStackView=filter.get("show_percent_stack_view"),
+            showLabelsOnSeries=filter.get("show_label_on_series"),
+        )
+    }
+
+
+def _funnels_filter(filter: Dict):
+    return {
+        "funnelsFilter": FunnelsFilter(
+            funnelVizType=filter.get("funnel_viz_type"),
+            funnelOrderType=filter.get("funnel_order_type"),
+            funnelFromStep=filter.get("funnel_from_step"),
+            funnelToStep=filter.get("funnel_to_step"),
+            funnelWindowIntervalUnit=filter.get("funnel_window_interval_unit"),
+            funnelWindowInterval=filter.get("funnel_window_interval"),
+            funnelStepReference=filter.get("funnel_step_reference"),
+            breakdownAttributionType=filter.get("breakdown_attribution_type"),
+            breakdownAttributionValue=filter.get("breakdown_attribution_value"),
+            binCount=filter.get("bin_count"),
+            exclusions=[exlusion_entity_to_node(entity) for entity in filter.get("exclusions", [])],
+            layout=filter.get("layout"),
+            # hidden_legend_breakdowns: cleanHiddenLegendSeries(filter.get('hidden_legend_keys')),
+            funnelAggregateByHogQL=filter.get("funnel_aggregate_by_hogql"),
+        ),
+    }
+
+
+def _retention_filter(filter: Dict):
+    return {
+        "retentionFilter": RetentionFilter(
+            retentionType=filter.get("retention_type"),
+            retentionReference=filter.get("retention_reference"),
+            totalIntervals=filter.get("total_intervals"),
+            returningEntity=to_base_entity_dict(filter.get("returning_entity"))
+            if filter.get("returning_entity") is not None
+            else None,
+            targetEntity=to_base_entity_dict(filter.get("target_entity"))
+            if filter.get("target_entity") is not None
+            else None,
+            period=filter.get("period"),
+        )
+    }
+
+
+def _paths_filter(filter: Dict):
+    return {
+        "pathsFilter": PathsFilter(
+            pathsHogQLExpression=filter.get("paths_hogql_expression"),
+            includeEventTypes=filter.get("include_event_types"),
+            startPoint=filter.get("start_point"),
+            endPoint=filter.get("end_point"),
+            pathGroupings=filter.get("path_groupings"),
+            excludeEvents=filter.get("exclude_events"),
+            stepLimit=filter.get("step_limit"),
+            pathReplacements=filter.get("path_replacements"),
+            localPathCleaningFilters=filter.get("local_path_cleaning_filters"),
+            edgeLimit=filter.get("edge_limit"),
+            minEdgeWeight=filter.get("min_edge_weight"),
+            maxEdgeWeight=filter.get("max_edge_weight"),
+            funnelPaths=filter.get("funnel_paths"),
+            funnelFilter=filter.get("funnel_filter"),
+        )
+    }
+
+
+def _lifecycle_filter(filter: Dict):
+    return {
+        "lifecycleFilter": LifecycleFilter(
+            toggledLifecycles=filter.get("toggledLifecycles"),
+            showValuesOnSeries=filter.get("show_values_on_series"),
+        )
+    }
+
+
+def _stickiness_filter(filter: Dict):
+    return {
+        "stickinessFilter": StickinessFilter(
+            compare=filter.get("compare"),
+            showLegend=filter.get("show_legend"),
+            # hidden_legend_indexes: cleanHiddenLegendIndexes(filter.get('hidden_legend_keys')),
+            showValuesOnSeries=filter.get("show_values_on_series"),
+        )
+    }
+
+
+_insight_filter_builders: Dict[str, Callable[[Dict], Dict]] = {
+    "TRENDS": _trends_filter,
+    "FUNNELS": _funnels_filter,
+    "RETENTION": _retention_filter,
+    "PATHS": _paths_filter,
+    "LIFECYCLE": _lifecycle_filter,
+    "STICKINESS": _stickiness_filter,
+}
+
+
+def _insight_filter(filter: Dict, insight_type: INSIGHT_TYPE):
+    build_insight_filter = _insight_filter_builders.get(insight_type)
+    if build_insight_filter is None:
         raise Exception(f"Invalid insight type {filter.get('insight')}.")
+    insight_filter = build_insight_filter(filter)
 
     if len(list(insight_filter.values())[0].model_dump(exclude_defaults=True)) == 0:
         return {}
@@ -474,29 +503,30 @@ def _insight_type(filter: Dict) -> INSIGHT_TYPE:
 
 
 def filter_to_query(filter: Dict) -> InsightQueryNode:
-    Query = insight_to_query_type[_insight_type(filter)]
+    insight_type = _insight_type(filter)
+    Query = insight_to_query_type[insight_type]
 
     data = {
         **_date_range(filter),
-        **_interval(filter),
-        **_series(filter),
+        **_interval(filter, insight_type),
+        **_series(filter, insight_type),
         **_sampling_factor(filter),
         **_filter_test_accounts(filter),
         **_properties(filter),
-        **_breakdown_filter(filter),
-        **_group_aggregation_filter(filter),
-        **_insight_filter(filter),
+        **_breakdown_filter(filter, insight_type),
+        **_group_aggregation_filter(filter, insight_type),
+        **_insight_filter(filter, insight_type),
     }
 
     return Query(**data)
 
 
 def filter_str_to_query(filters: str) -> InsightQueryNode:
-    filter = json.loads(filters)
+    filter = orjson.loads(filters)
     # we have insights that have been serialized to json twice in the database
     # due to people misunderstanding our api
     if isinstance(filter, str):
-        filter = json.loads(filter)
+        filter = orjson.loads(filter)
     # we also have insights wrapped in an additional array
     elif isinstance(filter, list):
         filter = filter[0]
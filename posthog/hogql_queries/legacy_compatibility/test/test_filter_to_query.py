@@ -1,5 +1,5 @@
 import pytest
-from posthog.hogql_queries.legacy_compatibility.filter_to_query import filter_to_query
+from posthog.hogql_queries.legacy_compatibility.filter_to_query import clean_properties, filter_to_query
 from posthog.schema import (
     ActionsNode,
     AggregationAxisFormat,
@@ -1538,3 +1538,24 @@ class TestFilterToQuery(BaseTest):
                 toggledLifecycles=[LifecycleToggle.new, LifecycleToggle.dormant],
             ),
         )
+
+    def test_clean_properties_returns_lists(self):
+        properties = clean_properties(
+            {
+                "type": "AND",
+                "values": [{"type": "OR", "values": [{"key": "$browser", "value": "Chrome", "type": "events"}]}],
+            }
+        )
+
+        self.assertEqual(
+            properties,
+            {
+                "type": "AND",
+                "values": [
+                    {
+                        "type": "OR",
+                        "values": [{"key": "$browser", "value": "Chrome", "type": "event", "operator": "exact"}],
+                    }
+                ],
+            },
+        )
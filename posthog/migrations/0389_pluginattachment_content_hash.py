@@ -0,0 +1,17 @@
+# Generated by Django 3.2.23 on 2024-01-12 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posthog", "0388_add_schema_to_batch_exports"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pluginattachment",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
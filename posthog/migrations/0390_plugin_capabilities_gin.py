@@ -0,0 +1,22 @@
+# Generated by Django 3.2.23 on 2024-01-15 10:12
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently  # type: ignore
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("posthog", "0389_pluginattachment_content_hash"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="plugin",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["capabilities"], name="posthog_plugin_capabilities", opclasses=["jsonb_path_ops"]
+            ),
+        ),
+    ]
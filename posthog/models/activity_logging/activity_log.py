@@ -320,7 +320,7 @@ def dict_changes_between(
     return changes
 
 
-def log_activity(
+def build_activity_log(
     *,
     organization_id: Optional[UUIDT],
     team_id: int,
@@ -331,7 +331,8 @@ def log_activity(
     detail: Detail,
     was_impersonated: Optional[bool],
     force_save: bool = False,
-) -> None:
+) -> Optional[ActivityLog]:
+    """Returns the unsaved log entry that log_activity would write, or None if it shouldn't be written."""
     if was_impersonated and user is None:
         logger.warn(
             "activity_log.failed_to_write_to_activity_log",
@@ -341,29 +342,56 @@ def log_activity(
             activity=activity,
             exception=ValueError("Cannot log impersonated activity without a user"),
         )
-        return
-    try:
-        if activity == "updated" and (detail.changes is None or len(detail.changes) == 0) and not force_save:
-            logger.warn(
-                "activity_log.ignore_update_activity_no_changes",
-                team_id=team_id,
-                organization_id=organization_id,
-                user_id=user.id if user else None,
-                scope=scope,
-            )
-            return
+        return None
+    if activity == "updated" and (detail.changes is None or len(detail.changes) == 0) and not force_save:
+        logger.warn(
+            "activity_log.ignore_update_activity_no_changes",
+            team_id=team_id,
+            organization_id=organization_id,
+            user_id=user.id if user else None,
+            scope=scope,
+        )
+        return None
+
+    return ActivityLog(
+        organization_id=organization_id,
+        team_id=team_id,
+        user=user,
+        was_impersonated=was_impersonated,
+        is_system=user is None,
+        item_id=str(item_id),
+        scope=scope,
+        activity=activity,
+        detail=detail,
+    )
 
-        ActivityLog.objects.create(
+
+def log_activity(
+    *,
+    organization_id: Optional[UUIDT],
+    team_id: int,
+    user: Optional[User],
+    item_id: Optional[Union[int, str, UUIDT]],
+    scope: str,
+    activity: str,
+    detail: Detail,
+    was_impersonated: Optional[bool],
+    force_save: bool = False,
+) -> None:
+    try:
+        activity_log = build_activity_log(
             organization_id=organization_id,
             team_id=team_id,
             user=user,
-            was_impersonated=was_impersonated,
-            is_system=user is None,
-            item_id=str(item_id),
+            item_id=item_id,
             scope=scope,
             activity=activity,
             detail=detail,
+            was_impersonated=was_impersonated,
+            force_save=force_save,
         )
+        if activity_log is not None:
+            activity_log.save()
     except Exception as e:
         logger.warn(
             "activity_log.failed_to_write_to_activity_log",
@@ -379,6 +407,16 @@ def log_activity(
             raise e
 
 
+def bulk_log_activity(activity_logs: List[Optional[ActivityLog]]) -> None:
+    """Writes log entries from build_activity_log in one query, with the same error handling as log_activity."""
+    try:
+        ActivityLog.objects.bulk_create([activity_log for activity_log in activity_logs if activity_log is not None])
+    except Exception as e:
+        logger.warn("activity_log.failed_to_write_to_activity_log", exception=e)
+        if settings.TEST:
+            raise e
+
+
 @dataclasses.dataclass(frozen=True)
 class ActivityPage:
     total_count: int
@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Optional, Tuple, cast
 from uuid import UUID
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.core import exceptions
 from django.db import models
 from django.db.models.signals import post_delete, post_save
@@ -139,6 +140,12 @@ class PluginManager(models.Manager):
 
 
 class Plugin(models.Model):
+    class Meta:
+        indexes = [
+            # For the pipeline views, which filter on `capabilities @> {"methods": [...]}`
+            GinIndex(name="posthog_plugin_capabilities", fields=["capabilities"], opclasses=["jsonb_path_ops"]),
+        ]
+
     class PluginType(models.TextChoices):
         LOCAL = "local", "local"  # url starts with "file:"
         CUSTOM = (
@@ -259,6 +266,8 @@ class PluginAttachment(models.Model):
     file_name: models.CharField = models.CharField(max_length=200)
     file_size: models.IntegerField = models.IntegerField()
     contents: models.BinaryField = models.BinaryField()
+    # blake2b digest of contents, lets re-uploads of the same file skip rewriting them
+    content_hash: models.CharField = models.CharField(max_length=32, null=True, blank=True)
 
 
 class PluginStorage(models.Model):
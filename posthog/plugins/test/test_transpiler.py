@@ -0,0 +1,106 @@
+import subprocess
+import sys
+from unittest import TestCase, mock
+
+from rest_framework.exceptions import ValidationError
+
+from posthog.plugins.transpiler import TranspilerPool
+
+# Speaks the same framing as `plugin-transpiler --server`, and upper-cases sources instead of transpiling them
+FAKE_TRANSPILER = r"""
+import json, struct, sys, time
+
+header = struct.Struct(">I")
+stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+while True:
+    raw_length = stdin.read(header.size)
+    if len(raw_length) < header.size:
+        break
+    source = json.loads(stdin.read(header.unpack(raw_length)[0]))["source"]
+    if source == "exit":
+        sys.exit(1)
+    if source == "hang":
+        time.sleep(60)
+    response = {"error": "Could not transpile\n"} if source == "error" else {"transpiled": source.upper()}
+    body = json.dumps(response).encode()
+    stdout.write(header.pack(len(body)) + body)
+    stdout.flush()
+"""
+
+real_popen = subprocess.Popen
+
+
+def fake_transpiler_popen(args, **kwargs):
+    return real_popen([sys.executable, "-c", FAKE_TRANSPILER], **kwargs)
+
+
+@mock.patch("posthog.plugins.transpiler.subprocess.Popen", side_effect=fake_transpiler_popen)
+class TestTranspilerPool(TestCase):
+    def setUp(self):
+        self.pool = TranspilerPool("plugin-transpiler/dist/index.js")
+
+    def tearDown(self):
+        while not self.pool._idle.empty():
+            self.pool._idle.get_nowait().close()
+
+    def test_reuses_the_idle_process(self, mock_popen):
+        self.assertEqual(self.pool.transpile("foo", "site"), "FOO")
+        self.assertEqual(self.pool.transpile("bar", "frontend"), "BAR")
+
+        self.assertEqual(mock_popen.call_count, 1)
+
+    def test_transpiles_sources_larger_than_the_pipe_buffer(self, mock_popen):
+        source = "x" * 1_000_000
+
+        self.assertEqual(self.pool.transpile(source, "site"), source.upper())
+
+    def test_error_frame_raises_validation_error(self, mock_popen):
+        with self.assertRaises(ValidationError) as context:
+            self.pool.transpile("error", "site")
+
+        self.assertEqual(str(context.exception), "Could not transpile\n")
+        # The process itself is fine, so it's kept for the next call
+        self.assertEqual(self.pool.transpile("foo", "site"), "FOO")
+        self.assertEqual(mock_popen.call_count, 1)
+
+    def test_process_exiting_mid_request_is_discarded(self, mock_popen):
+        with self.assertRaises(Exception) as context:
+            self.pool.transpile("exit", "site")
+
+        self.assertIn("Transpiler process exited", str(context.exception))
+        self.assertTrue(self.pool._idle.empty())
+        self.assertEqual(self.pool.transpile("foo", "site"), "FOO")
+        self.assertEqual(mock_popen.call_count, 2)
+
+    def test_dead_idle_process_is_replaced(self, mock_popen):
+        self.pool.transpile("foo", "site")
+        idle_process = self.pool._idle.queue[0]
+        idle_process.process.kill()
+        idle_process.process.wait()
+
+        self.assertEqual(self.pool.transpile("bar", "site"), "BAR")
+        self.assertEqual(mock_popen.call_count, 2)
+
+    @mock.patch("posthog.plugins.transpiler.TRANSPILE_TIMEOUT_SECONDS", 0.5)
+    def test_wedged_process_times_out_and_is_killed(self, mock_popen):
+        with self.assertRaises(Exception) as context:
+            self.pool.transpile("hang", "site")
+
+        self.assertEqual(str(context.exception), "Transpiler process timed out")
+        self.assertTrue(self.pool._idle.empty())
+        self.assertEqual(self.pool.transpile("foo", "site"), "FOO")
+        self.assertEqual(mock_popen.call_count, 2)
+
+    def test_pool_is_reset_after_fork(self, mock_popen):
+        self.pool.transpile("foo", "site")
+        parent_process = self.pool._idle.queue[0]
+
+        # As seen from a forked worker, the pool was set up by another process
+        self.pool._pid = -1
+        self.assertEqual(self.pool.transpile("bar", "site"), "BAR")
+        child_process = self.pool._idle.queue[0]
+
+        # The child starts its own process instead of using the parent's pipes
+        self.assertIsNot(child_process, parent_process)
+        self.assertEqual(mock_popen.call_count, 2)
+        parent_process.close()
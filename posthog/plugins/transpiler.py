@@ -0,0 +1,166 @@
+import json
+import os
+import queue
+import select
+import struct
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from rest_framework.exceptions import ValidationError
+
+FRAME_HEADER = struct.Struct(">I")
+
+# Longest a single transpilation may take before the process is assumed to be stuck and is killed
+TRANSPILE_TIMEOUT_SECONDS = 30
+
+
+class TranspilerError(ValidationError):
+    """
+    The transpiler rejected the source. `str()` gives the transpiler's own error text, as that's what gets
+    stored on the source file and shown to the user.
+    """
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class TranspilerProcess:
+    """
+    A long-lived `node plugin-transpiler/dist/index.js --server` process.
+
+    Requests and responses are length-prefixed JSON frames, so one warm process can transpile many sources
+    without paying Node's startup cost for each of them. The pipes are non-blocking and every request has a
+    deadline, so a wedged process raises instead of blocking the caller forever.
+    """
+
+    def __init__(self, transpiler_path: str):
+        self.process = subprocess.Popen(
+            ["node", transpiler_path, "--server"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        assert self.process.stdin is not None and self.process.stdout is not None
+        self._stdin_fd = self.process.stdin.fileno()
+        self._stdout_fd = self.process.stdout.fileno()
+        os.set_blocking(self._stdin_fd, False)
+        os.set_blocking(self._stdout_fd, False)
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        deadline = time.monotonic() + TRANSPILE_TIMEOUT_SECONDS
+        body = json.dumps(message).encode()
+        self._write_all(FRAME_HEADER.pack(len(body)) + body, deadline)
+
+        (length,) = FRAME_HEADER.unpack(self._read_exactly(FRAME_HEADER.size, deadline))
+        return json.loads(self._read_exactly(length, deadline))
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self) -> None:
+        try:
+            self.process.kill()
+            self.process.wait()
+            for pipe in (self.process.stdin, self.process.stdout):
+                if pipe is not None:
+                    pipe.close()
+        except Exception:
+            pass
+
+    def _wait_for(self, fd: int, event: int, deadline: float) -> None:
+        remaining = deadline - time.monotonic()
+        poller = select.poll()
+        poller.register(fd, event)
+        if remaining <= 0 or not poller.poll(remaining * 1000):
+            raise Exception("Transpiler process timed out")
+
+    def _write_all(self, data: bytes, deadline: float) -> None:
+        # A non-blocking write may take only part of the frame, keep going until all of it is sent
+        view = memoryview(data)
+        while view:
+            self._wait_for(self._stdin_fd, select.POLLOUT, deadline)
+            try:
+                written = os.write(self._stdin_fd, view)
+            except BlockingIOError:
+                continue
+            view = view[written:]
+
+    def _read_exactly(self, size: int, deadline: float) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            self._wait_for(self._stdout_fd, select.POLLIN, deadline)
+            try:
+                chunk = os.read(self._stdout_fd, size - len(data))
+            except BlockingIOError:
+                continue
+            if not chunk:
+                raise Exception(f"Transpiler process exited with code {self.process.poll()}")
+            data += chunk
+        return bytes(data)
+
+
+class TranspilerPool:
+    """
+    Hands out warm transpiler processes, one per concurrent caller.
+
+    A new process is started whenever none is idle. Up to `max_idle` processes are kept around for reuse,
+    and a process that fails or times out mid-request is discarded instead of being returned to the pool.
+    """
+
+    def __init__(self, transpiler_path: str, max_idle: int = 1):
+        self.transpiler_path = transpiler_path
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._reset()
+
+    def transpile(self, source: str, type: str) -> str:
+        process = self._checkout()
+        try:
+            result = process.request({"type": type, "source": source})
+        except Exception:
+            process.close()
+            raise
+        self._checkin(process)
+
+        if "error" in result:
+            raise TranspilerError(result["error"])
+        return result["transpiled"]
+
+    def _reset(self) -> None:
+        self._idle: "queue.LifoQueue[TranspilerProcess]" = queue.LifoQueue()
+        # Pipes must not be shared with forked workers, so each process gets its own pool
+        self._pid = os.getpid()
+
+    def _checkout(self) -> TranspilerProcess:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                return TranspilerProcess(self.transpiler_path)
+            if process.is_alive():
+                return process
+            process.close()
+
+    def _checkin(self, process: TranspilerProcess) -> None:
+        if self._pid == os.getpid() and self._idle.qsize() < self.max_idle:
+            self._idle.put(process)
+        else:
+            process.close()
+
+
+_transpiler_pool: Optional[TranspilerPool] = None
+
+
+def get_transpiler_pool() -> TranspilerPool:
+    global _transpiler_pool
+    if _transpiler_pool is None:
+        from posthog.settings.base_variables import BASE_DIR
+
+        _transpiler_pool = TranspilerPool(os.path.join(BASE_DIR, "plugin-transpiler/dist/index.js"))
+    return _transpiler_pool
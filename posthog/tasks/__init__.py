@@ -8,6 +8,7 @@ from . import (
     demo_reset_master_team,
     email,
     exporter,
+    plugin_source,
     process_scheduled_changes,
     prompts,
     split_person,
@@ -27,6 +28,7 @@ __all__ = [
     "demo_reset_master_team",
     "email",
     "exporter",
+    "plugin_source",
     "process_scheduled_changes",
     "prompts",
     "split_person",
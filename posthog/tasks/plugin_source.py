@@ -0,0 +1,27 @@
+from celery import shared_task
+
+from posthog.models.plugin import PluginSourceFile
+
+
+@shared_task(ignore_result=True, max_retries=1)
+def transpile_plugin_source_file(plugin_source_file_id: str) -> None:
+    from posthog.api.plugin import TRANSPILED_SOURCE_FILES, transpile
+
+    plugin_source_file = PluginSourceFile.objects.filter(pk=plugin_source_file_id).first()
+    # Gone, or already transpiled by a later synchronous save
+    if plugin_source_file is None or plugin_source_file.status is not None:
+        return
+
+    try:
+        transpiled = transpile(plugin_source_file.source, type=TRANSPILED_SOURCE_FILES[plugin_source_file.filename])
+        error = None
+        status = PluginSourceFile.Status.TRANSPILED
+    except Exception as e:
+        transpiled = None
+        error = str(e)
+        status = PluginSourceFile.Status.ERROR
+
+    # Don't overwrite the result for a newer source, its own task will handle that
+    PluginSourceFile.objects.filter(
+        pk=plugin_source_file.pk, source=plugin_source_file.source, status__isnull=True
+    ).update(transpiled=transpiled, error=error, status=status)